@@ -3542,27 +3542,37 @@ class ComputeManager(manager.SchedulerDependentManager):
                 # they just don't get the info in the usage events.
                 return
 
+            if not bw_counters:
+                return
+
+            # Fetch the usage of the current and previous audit periods
+            # for every instance network in one call rather than up to two
+            # per counter.
+            uuids = list(set(bw_ctr['uuid'] for bw_ctr in bw_counters))
+            known_usages = {}
+            for usage in self.conductor_api.bw_usage_get_by_uuids_and_periods(
+                    context, uuids, [start_time, prev_time]):
+                period = usage['start_period']
+                if isinstance(period, basestring):
+                    period = timeutils.parse_strtime(period)
+                known_usages[(usage['uuid'], usage['mac'], period)] = usage
+
             refreshed = timeutils.utcnow()
+            usages = []
             for bw_ctr in bw_counters:
-                # Allow switching of greenthreads between queries.
-                greenthread.sleep(0)
                 bw_in = 0
                 bw_out = 0
                 last_ctr_in = None
                 last_ctr_out = None
-                usage = self.conductor_api.bw_usage_get(context,
-                                                        bw_ctr['uuid'],
-                                                        start_time,
-                                                        bw_ctr['mac_address'])
+                key = (bw_ctr['uuid'], bw_ctr['mac_address'])
+                usage = known_usages.get(key + (start_time,))
                 if usage:
                     bw_in = usage['bw_in']
                     bw_out = usage['bw_out']
                     last_ctr_in = usage['last_ctr_in']
                     last_ctr_out = usage['last_ctr_out']
                 else:
-                    usage = self.conductor_api.bw_usage_get(
-                        context, bw_ctr['uuid'], prev_time,
-                        bw_ctr['mac_address'])
+                    usage = known_usages.get(key + (prev_time,))
                     if usage:
                         last_ctr_in = usage['last_ctr_in']
                         last_ctr_out = usage['last_ctr_out']
@@ -3581,14 +3591,15 @@ class ComputeManager(manager.SchedulerDependentManager):
                     else:
                         bw_out += (bw_ctr['bw_out'] - last_ctr_out)
 
-                self.conductor_api.bw_usage_update(context,
-                                                   bw_ctr['uuid'],
-                                                   bw_ctr['mac_address'],
-                                                   start_time,
-                                                   bw_in,
-                                                   bw_out,
-                                                   bw_ctr['bw_in'],
-                                                   bw_ctr['bw_out'],
+                usages.append(dict(uuid=bw_ctr['uuid'],
+                                   mac=bw_ctr['mac_address'],
+                                   bw_in=bw_in,
+                                   bw_out=bw_out,
+                                   last_ctr_in=bw_ctr['bw_in'],
+                                   last_ctr_out=bw_ctr['bw_out']))
+
+            self.conductor_api.bw_usage_update_all(context, start_time,
+                                                   usages,
                                                    last_refreshed=refreshed)
 
     def _get_host_volume_bdms(self, context, host):
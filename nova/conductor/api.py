@@ -172,6 +172,16 @@ class LocalAPI(object):
                                              last_ctr_in, last_ctr_out,
                                              last_refreshed)
 
+    def bw_usage_get_by_uuids_and_periods(self, context, uuids,
+                                          start_periods):
+        return self._manager.bw_usage_get_by_uuids_and_periods(
+            context, uuids, start_periods)
+
+    def bw_usage_update_all(self, context, start_period, usages,
+                            last_refreshed=None):
+        return self._manager.bw_usage_update_all(context, start_period,
+                                                 usages, last_refreshed)
+
     def get_backdoor_port(self, context, host):
         raise exc.InvalidRequest
 
@@ -503,6 +513,16 @@ class API(object):
             bw_in, bw_out, last_ctr_in, last_ctr_out,
             last_refreshed)
 
+    def bw_usage_get_by_uuids_and_periods(self, context, uuids,
+                                          start_periods):
+        return self.conductor_rpcapi.bw_usage_get_by_uuids_and_periods(
+            context, uuids, start_periods)
+
+    def bw_usage_update_all(self, context, start_period, usages,
+                            last_refreshed=None):
+        return self.conductor_rpcapi.bw_usage_update_all(
+            context, start_period, usages, last_refreshed)
+
     #NOTE(mtreinish): This doesn't work on multiple conductors without any
     # topic calculation in conductor_rpcapi. So the host param isn't used
     # currently.
@@ -49,7 +49,7 @@ datetime_fields = ['launched_at', 'terminated_at', 'updated_at']
 class ConductorManager(manager.Manager):
     """Mission: TBD."""
 
-    RPC_API_VERSION = '1.46'
+    RPC_API_VERSION = '1.47'
 
     def __init__(self, *args, **kwargs):
         super(ConductorManager, self).__init__(*args, **kwargs)
@@ -200,6 +200,17 @@ class ConductorManager(manager.Manager):
         usage = self.db.bw_usage_get(context, uuid, start_period, mac)
         return jsonutils.to_primitive(usage)
 
+    def bw_usage_get_by_uuids_and_periods(self, context, uuids,
+                                          start_periods):
+        usages = self.db.bw_usage_get_by_uuids_and_periods(context, uuids,
+                                                           start_periods)
+        return jsonutils.to_primitive(usages)
+
+    def bw_usage_update_all(self, context, start_period, usages,
+                            last_refreshed=None):
+        self.db.bw_usage_update_all(context, start_period, usages,
+                                    last_refreshed)
+
     def get_backdoor_port(self, context):
         return self.backdoor_port
 
@@ -84,6 +84,8 @@ class ConductorAPI(nova.openstack.common.rpc.proxy.RpcProxy):
     1.44 - Added compute_node_delete
     1.45 - Added project_id to quota_commit and quota_rollback
     1.46 - Added compute_confirm_resize
+    1.47 - Added bw_usage_get_by_uuids_and_periods and
+           bw_usage_update_all
     """
 
     BASE_RPC_API_VERSION = '1.0'
@@ -198,6 +200,18 @@ class ConductorAPI(nova.openstack.common.rpc.proxy.RpcProxy):
                             last_refreshed=last_refreshed)
         return self.call(context, msg, version='1.5')
 
+    def bw_usage_get_by_uuids_and_periods(self, context, uuids,
+                                          start_periods):
+        msg = self.make_msg('bw_usage_get_by_uuids_and_periods',
+                            uuids=uuids, start_periods=start_periods)
+        return self.call(context, msg, version='1.47')
+
+    def bw_usage_update_all(self, context, start_period, usages,
+                            last_refreshed=None):
+        msg = self.make_msg('bw_usage_update_all', start_period=start_period,
+                            usages=usages, last_refreshed=last_refreshed)
+        return self.call(context, msg, version='1.47')
+
     def get_backdoor_port(self, context):
         msg = self.make_msg('get_backdoor_port')
         return self.call(context, msg, version='1.6')
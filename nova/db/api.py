@@ -177,9 +177,13 @@ def compute_node_get(context, compute_id):
     return IMPL.compute_node_get(context, compute_id)
 
 
-def compute_node_get_all(context):
-    """Get all computeNodes."""
-    return IMPL.compute_node_get_all(context)
+def compute_node_get_all(context, updated_since=None):
+    """Get all computeNodes.
+
+    If updated_since is given, only return the computeNodes that were
+    updated, or whose service was updated, after that time.
+    """
+    return IMPL.compute_node_get_all(context, updated_since=updated_since)
 
 
 def compute_node_search_by_hypervisor(context, hypervisor_match):
@@ -506,6 +510,12 @@ def fixed_ips_by_virtual_interface(context, vif_id):
     return IMPL.fixed_ips_by_virtual_interface(context, vif_id)
 
 
+def fixed_ip_get_by_address_filter(context, address=None, address_like=None):
+    """Get instance fixed ips, with their floating ips, by address filter."""
+    return IMPL.fixed_ip_get_by_address_filter(context, address=address,
+                                               address_like=address_like)
+
+
 def fixed_ip_update(context, address, values):
     """Create a fixed ip from the values dictionary."""
     return IMPL.fixed_ip_update(context, address, values)
@@ -838,9 +848,14 @@ def network_in_use_on_host(context, network_id, host=None):
     return IMPL.network_in_use_on_host(context, network_id, host)
 
 
-def network_get_associated_fixed_ips(context, network_id, host=None):
-    """Get all network's ips that have been associated."""
-    return IMPL.network_get_associated_fixed_ips(context, network_id, host)
+def network_get_associated_fixed_ips(context, network_id, host=None,
+                                     address=None):
+    """Get all network's ips that have been associated.
+
+    Only returns the given fixed ip address if there is one.
+    """
+    return IMPL.network_get_associated_fixed_ips(context, network_id, host,
+                                                 address=address)
 
 
 def network_get_by_uuid(context, uuid):
@@ -1413,6 +1428,12 @@ def bw_usage_get_by_uuids(context, uuids, start_period):
     return IMPL.bw_usage_get_by_uuids(context, uuids, start_period)
 
 
+def bw_usage_get_by_uuids_and_periods(context, uuids, start_periods):
+    """Return bw usages for instance(s) in any of the given audit periods."""
+    return IMPL.bw_usage_get_by_uuids_and_periods(context, uuids,
+                                                  start_periods)
+
+
 def bw_usage_update(context, uuid, mac, start_period, bw_in, bw_out,
                     last_ctr_in, last_ctr_out, last_refreshed=None,
                     update_cells=True):
@@ -1431,6 +1452,30 @@ def bw_usage_update(context, uuid, mac, start_period, bw_in, bw_out,
     return rv
 
 
+def bw_usage_update_all(context, start_period, usages, last_refreshed=None,
+                        update_cells=True):
+    """Update cached bandwidth usage for many instance networks in one
+    transaction.  Creates new records if needed.
+
+    :param usages: list of dicts with the uuid, mac, bw_in, bw_out,
+                   last_ctr_in and last_ctr_out of each instance network
+    """
+    rv = IMPL.bw_usage_update_all(context, start_period, usages,
+                                  last_refreshed=last_refreshed)
+    if update_cells:
+        try:
+            cells_api = cells_rpcapi.CellsAPI()
+            for usage in usages:
+                cells_api.bw_usage_update_at_top(context,
+                        usage['uuid'], usage['mac'], start_period,
+                        usage['bw_in'], usage['bw_out'],
+                        usage['last_ctr_in'], usage['last_ctr_out'],
+                        last_refreshed)
+        except Exception:
+            LOG.exception(_("Failed to notify cells of bw_usage update"))
+    return rv
+
+
 ####################
 
 
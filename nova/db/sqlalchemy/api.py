@@ -458,11 +458,19 @@ def _compute_node_get(context, compute_id, session=None):
 
 
 @require_admin_context
-def compute_node_get_all(context):
-    return model_query(context, models.ComputeNode).\
+def compute_node_get_all(context, updated_since=None):
+    query = model_query(context, models.ComputeNode).\
             options(joinedload('service')).\
-            options(joinedload('stats')).\
-            all()
+            options(joinedload('stats'))
+
+    if updated_since is not None:
+        updated_since = timeutils.normalize_time(updated_since)
+        query = query.filter(or_(
+                models.ComputeNode.updated_at > updated_since,
+                models.ComputeNode.service.has(
+                        models.Service.updated_at > updated_since)))
+
+    return query.all()
 
 
 @require_admin_context
@@ -1247,6 +1255,61 @@ def fixed_ips_by_virtual_interface(context, vif_id):
     return result
 
 
+def _ip_address_like(column, pattern):
+    # NOTE: postgresql stores addresses as INET, which has no LIKE operator
+    # and renders with a netmask when cast to text.
+    if get_engine().name == 'postgresql':
+        column = func.host(column)
+    return column.like(pattern)
+
+
+@require_context
+def fixed_ip_get_by_address_filter(context, address=None, address_like=None):
+    """Return the fixed ips of all instances, with their floating ips,
+    whose fixed address is address or whose fixed or floating address
+    matches the SQL LIKE pattern address_like.  With neither filter every
+    fixed ip attached to an instance is returned.
+    """
+    query = model_query(context, models.FixedIp.id, models.FixedIp.address,
+                        models.VirtualInterface.instance_uuid,
+                        models.FloatingIp.address,
+                        base_model=models.FixedIp, read_deleted="no").\
+                join((models.VirtualInterface,
+                      models.VirtualInterface.id ==
+                      models.FixedIp.virtual_interface_id)).\
+                outerjoin((models.FloatingIp,
+                           and_(models.FloatingIp.fixed_ip_id ==
+                                models.FixedIp.id,
+                                models.FloatingIp.deleted == 0))).\
+                filter(models.VirtualInterface.instance_uuid != None).\
+                filter(models.FixedIp.address != None)
+
+    conditions = []
+    if address is not None:
+        conditions.append(models.FixedIp.address == address)
+    if address_like is not None:
+        conditions.append(_ip_address_like(models.FixedIp.address,
+                                           address_like))
+        conditions.append(_ip_address_like(models.FloatingIp.address,
+                                           address_like))
+    if conditions:
+        query = query.filter(or_(*conditions))
+
+    query = query.order_by(models.VirtualInterface.id,
+                           models.FixedIp.id,
+                           models.FloatingIp.id)
+
+    fixed_ips = collections.OrderedDict()
+    for fixed_ip_id, fixed_address, instance_uuid, floating_address in query:
+        fixed_ip = fixed_ips.setdefault(fixed_ip_id,
+                                        {'address': fixed_address,
+                                         'instance_uuid': instance_uuid,
+                                         'floating_ips': []})
+        if floating_address is not None:
+            fixed_ip['floating_ips'].append(floating_address)
+    return fixed_ips.values()
+
+
 @require_context
 def fixed_ip_update(context, address, values):
     session = get_session()
@@ -2170,7 +2233,8 @@ def network_get_all_by_uuids(context, network_uuids,
 
 
 @require_admin_context
-def network_get_associated_fixed_ips(context, network_id, host=None):
+def network_get_associated_fixed_ips(context, network_id, host=None,
+                                     address=None):
     # FIXME(sirp): since this returns fixed_ips, this would be better named
     # fixed_ip_get_all_by_network.
     # NOTE(vish): The ugly joins here are to solve a performance issue and
@@ -2201,6 +2265,8 @@ def network_get_associated_fixed_ips(context, network_id, host=None):
                           filter(models.FixedIp.virtual_interface_id != None)
     if host:
         query = query.filter(models.Instance.host == host)
+    if address:
+        query = query.filter(models.FixedIp.address == address)
     result = query.all()
     data = []
     for datum in result:
@@ -3911,6 +3977,15 @@ def bw_usage_get_by_uuids(context, uuids, start_period):
                    all()
 
 
+@require_context
+def bw_usage_get_by_uuids_and_periods(context, uuids, start_periods):
+    return model_query(context, models.BandwidthUsage, read_deleted="yes").\
+                   filter(models.BandwidthUsage.uuid.in_(uuids)).\
+                   filter(models.BandwidthUsage.start_period.in_(
+                          start_periods)).\
+                   all()
+
+
 @require_context
 @_retry_on_deadlock
 def bw_usage_update(context, uuid, mac, start_period, bw_in, bw_out,
@@ -3952,6 +4027,43 @@ def bw_usage_update(context, uuid, mac, start_period, bw_in, bw_out,
         bwusage.save(session=session)
 
 
+@require_context
+@_retry_on_deadlock
+def bw_usage_update_all(context, start_period, usages, last_refreshed=None,
+                        session=None):
+    if not session:
+        session = get_session()
+
+    if not usages:
+        return
+
+    if last_refreshed is None:
+        last_refreshed = timeutils.utcnow()
+
+    with session.begin():
+        uuids = [usage['uuid'] for usage in usages]
+        rows = model_query(context, models.BandwidthUsage,
+                           session=session, read_deleted="yes").\
+                      filter(models.BandwidthUsage.uuid.in_(uuids)).\
+                      filter_by(start_period=start_period).\
+                      all()
+        bwusages = dict(((row.uuid, row.mac), row) for row in rows)
+
+        for usage in usages:
+            bwusage = bwusages.get((usage['uuid'], usage['mac']))
+            if bwusage is None:
+                bwusage = models.BandwidthUsage()
+                bwusage.start_period = start_period
+                bwusage.uuid = usage['uuid']
+                bwusage.mac = usage['mac']
+                session.add(bwusage)
+            bwusage.last_refreshed = last_refreshed
+            bwusage.bw_in = usage['bw_in']
+            bwusage.bw_out = usage['bw_out']
+            bwusage.last_ctr_in = usage['last_ctr_in']
+            bwusage.last_ctr_out = usage['last_ctr_out']
+
+
 ####################
 
 
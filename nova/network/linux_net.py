@@ -20,11 +20,14 @@
 """Implements vlans, bridges, and iptables rules using linux utilities."""
 
 import calendar
+import collections
 import inspect
 import netaddr
 import os
 import re
+import time
 
+from eventlet import greenthread
 from oslo.config import cfg
 
 from nova import db
@@ -122,6 +125,19 @@ linux_net_opts = [
                default='DROP',
                help=('The table that iptables to jump to when a packet is '
                      'to be dropped.')),
+    cfg.IntOpt('iptables_full_sync_interval',
+               default=600,
+               help='Seconds between full rewrites of the iptables rules. '
+                    'In between, only chains that changed since the last '
+                    'apply are rewritten. Set to 0 to always rewrite all '
+                    'rules.'),
+    cfg.FloatOpt('dnsmasq_reload_delay',
+                 default=1.0,
+                 help='Seconds to wait after a fixed ip is allocated or '
+                      'released before rewriting the dnsmasq host file and '
+                      'reloading dnsmasq, so that changes made meanwhile '
+                      'are applied together. Set to 0 to apply every '
+                      'change immediately.'),
     ]
 
 CONF = cfg.CONF
@@ -291,10 +307,38 @@ class IptablesTable(object):
 
     def empty_chain(self, chain, wrap=True):
         """Remove all rules from a chain."""
-        chained_rules = [rule for rule in self.rules
-                              if rule.chain == chain and rule.wrap == wrap]
-        for rule in chained_rules:
-            self.rules.remove(rule)
+        self.rules = [rule for rule in self.rules
+                      if rule.chain != chain or rule.wrap != wrap]
+
+    def get_state(self):
+        """Return a comparable snapshot of the rules in this table.
+
+        The snapshot is a tuple of a dict mapping each wrapped chain to
+        the rule lines it will contain once applied, and a tuple
+        describing the unwrapped chains and rules, which are shared with
+        other components and so can only be applied in full.
+
+        """
+        top_rules = dict((name, []) for name in self.chains)
+        bottom_rules = dict((name, []) for name in self.chains)
+        unwrapped = [tuple(sorted(self.unwrapped_chains))]
+        for rule in self.rules:
+            if not rule.wrap:
+                unwrapped.append((rule.chain, rule.rule, rule.top))
+            elif rule.top:
+                top_rules[rule.chain].append(str(rule))
+            else:
+                bottom_rules[rule.chain].append(str(rule))
+
+        wrapped = {}
+        for name in self.chains:
+            # Duplicates are dropped keeping the last occurrence, as
+            # IptablesManager._modify_rules does.
+            lines = top_rules[name] + bottom_rules[name]
+            last = dict((line, i) for i, line in enumerate(lines))
+            wrapped[name] = tuple(line for i, line in enumerate(lines)
+                                  if last[line] == i)
+        return wrapped, tuple(unwrapped)
 
 
 class IptablesManager(object):
@@ -318,6 +362,12 @@ class IptablesManager(object):
     wrapped in the same was as the built-in filter chains. Additionally,
     there's a snat chain that is applied after the POSTROUTING chain.
 
+    The state of every table is remembered after it is applied. As long as
+    only wrapped chains change, later applies rewrite just those chains
+    with iptables-restore --noflush. Every iptables_full_sync_interval
+    seconds, or whenever unwrapped chains or rules change, the whole
+    ruleset is rewritten again.
+
     """
 
     def __init__(self, execute=None):
@@ -333,6 +383,10 @@ class IptablesManager(object):
 
         self.iptables_apply_deferred = False
 
+        # Table states as of the last apply, by command
+        self.applied_state = {}
+        self.last_full_sync = None
+
         # Add a nova-filter-top chain. It's intended to be shared
         # among the various nova components. It sits at the very top
         # of FORWARD and OUTPUT.
@@ -409,20 +463,77 @@ class IptablesManager(object):
         if CONF.use_ipv6:
             s += [('ip6tables', self.ipv6)]
 
+        now = time.time()
+        full_sync = (self.last_full_sync is None or
+                     now - self.last_full_sync >=
+                     CONF.iptables_full_sync_interval)
+
         for cmd, tables in s:
-            all_tables, _err = self.execute('%s-save' % (cmd,), '-c',
-                                                run_as_root=True,
-                                                attempts=5)
-            all_lines = all_tables.split('\n')
-            for table_name, table in tables.iteritems():
-                start, end = self._find_table(all_lines, table_name)
-                all_lines[start:end] = self._modify_rules(
-                        all_lines[start:end], table, table_name)
-            self.execute('%s-restore' % (cmd,), '-c', run_as_root=True,
-                         process_input='\n'.join(all_lines),
-                         attempts=5)
+            states = dict((table_name, table.get_state())
+                          for table_name, table in tables.iteritems())
+            applied = self.applied_state.pop(cmd, None)
+            if full_sync or not self._can_apply_changes(tables, states,
+                                                        applied):
+                self._apply_full(cmd, tables)
+            else:
+                self._apply_changes(cmd, states, applied)
+            self.applied_state[cmd] = states
+
+        if full_sync:
+            self.last_full_sync = now
         LOG.debug(_("IPTablesManager.apply completed with success"))
 
+    def _apply_full(self, cmd, tables):
+        all_tables, _err = self.execute('%s-save' % (cmd,), '-c',
+                                        run_as_root=True,
+                                        attempts=5)
+        all_lines = all_tables.split('\n')
+        for table_name, table in tables.iteritems():
+            start, end = self._find_table(all_lines, table_name)
+            all_lines[start:end] = self._modify_rules(
+                    all_lines[start:end], table, table_name)
+        self.execute('%s-restore' % (cmd,), '-c', run_as_root=True,
+                     process_input='\n'.join(all_lines),
+                     attempts=5)
+
+    def _can_apply_changes(self, tables, states, applied):
+        """Whether states can be reached from applied by rewriting only
+        wrapped chains."""
+        if applied is None or set(applied) != set(states):
+            return False
+        for table_name, table in tables.iteritems():
+            if table.remove_rules or table.remove_chains:
+                return False
+            if states[table_name][1] != applied[table_name][1]:
+                return False
+        return True
+
+    def _apply_changes(self, cmd, states, applied):
+        lines = []
+        for table_name, (chains, _unwrapped) in states.iteritems():
+            old_chains = applied[table_name][0]
+            changed = sorted(name for name, rules in chains.iteritems()
+                             if old_chains.get(name) != rules)
+            removed = sorted(set(old_chains) - set(chains))
+            if not changed and not removed:
+                continue
+
+            # Declaring a chain flushes it, or creates it if it is new.
+            # Removed chains have to be empty before they can be deleted.
+            lines.append('*%s' % table_name)
+            lines += [':%s-%s - [0:0]' % (binary_name, name)
+                      for name in changed + removed]
+            for name in changed:
+                lines += chains[name]
+            lines += ['-X %s-%s' % (binary_name, name) for name in removed]
+            lines.append('COMMIT')
+
+        if lines:
+            self.execute('%s-restore' % (cmd,), '-c', '--noflush',
+                         run_as_root=True,
+                         process_input='\n'.join(lines) + '\n',
+                         attempts=5)
+
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
             # length only <2 when fake iptables
@@ -457,19 +568,17 @@ class IptablesManager(object):
 
         if CONF.iptables_top_regex:
             regex = re.compile(CONF.iptables_top_regex)
-            temp_filter = filter(lambda line: regex.search(line), new_filter)
-            for rule_str in temp_filter:
-                new_filter = filter(lambda s: s.strip() != rule_str.strip(),
-                                    new_filter)
-            top_rules = temp_filter
+            top_rules = filter(lambda line: regex.search(line), new_filter)
+            top_set = set(line.strip() for line in top_rules)
+            new_filter = filter(lambda s: s.strip() not in top_set,
+                                new_filter)
 
         if CONF.iptables_bottom_regex:
             regex = re.compile(CONF.iptables_bottom_regex)
-            temp_filter = filter(lambda line: regex.search(line), new_filter)
-            for rule_str in temp_filter:
-                new_filter = filter(lambda s: s.strip() != rule_str.strip(),
-                    new_filter)
-            bottom_rules = temp_filter
+            bottom_rules = filter(lambda line: regex.search(line), new_filter)
+            bottom_set = set(line.strip() for line in bottom_rules)
+            new_filter = filter(lambda s: s.strip() not in bottom_set,
+                                new_filter)
 
         seen_chains = False
         rules_index = 0
@@ -484,39 +593,41 @@ class IptablesManager(object):
         if not seen_chains:
             rules_index = 2
 
+        def _strip_counts(line):
+            # ignore [packet:byte] counts at beginning of lines
+            if line.startswith('['):
+                line = line.split(']', 1)[1]
+            return line.strip()
+
+        # rule.top == True means we want this rule to be at the top.
+        # Further down, we weed out duplicates from the bottom of the
+        # list, so here we remove the dupes ahead of time.
+
+        # We don't want to remove an entry if it has non-zero
+        # [packet:byte] counts and replace it with [0:0], so let's
+        # go look for a duplicate, and over-ride our table rule if
+        # found.
+        top_strs = set(_strip_counts(str(rule)) for rule in rules
+                       if rule.top)
+        dups = {}
+        if top_strs:
+            remaining = []
+            for line in new_filter:
+                key = _strip_counts(line)
+                if key in top_strs:
+                    # keep the last entry, if there is one
+                    dups[key] = line
+                else:
+                    remaining.append(line)
+            new_filter = remaining
+
         our_rules = top_rules
         bot_rules = []
         for rule in rules:
             rule_str = str(rule)
             if rule.top:
-                # rule.top == True means we want this rule to be at the top.
-                # Further down, we weed out duplicates from the bottom of the
-                # list, so here we remove the dupes ahead of time.
-
-                # We don't want to remove an entry if it has non-zero
-                # [packet:byte] counts and replace it with [0:0], so let's
-                # go look for a duplicate, and over-ride our table rule if
-                # found.
-
-                # ignore [packet:byte] counts at beginning of line
-                if rule_str.startswith('['):
-                    rule_str = rule_str.split(']', 1)[1]
-                dup_filter = filter(lambda s: rule_str.strip() in s.strip(),
-                                    new_filter)
-
-                new_filter = filter(lambda s:
-                                    rule_str.strip() not in s.strip(),
-                                    new_filter)
                 # if no duplicates, use original rule
-                if dup_filter:
-                    # grab the last entry, if there is one
-                    dup = dup_filter[-1]
-                    rule_str = str(dup)
-                else:
-                    rule_str = str(rule)
-                rule_str.strip()
-
-                our_rules += [rule_str]
+                our_rules += [dups.get(_strip_counts(rule_str), rule_str)]
             else:
                 bot_rules += [rule_str]
 
@@ -535,16 +646,20 @@ class IptablesManager(object):
         seen_lines = set()
 
         def _weed_out_duplicates(line):
-            # ignore [packet:byte] counts at beginning of lines
-            if line.startswith('['):
-                line = line.split(']', 1)[1]
-            line = line.strip()
+            line = _strip_counts(line)
             if line in seen_lines:
                 return False
             else:
                 seen_lines.add(line)
                 return True
 
+        # Each pending removal drops one matching line
+        chains_to_remove = set(remove_chains)
+        rules_to_remove = {}
+        for rule in remove_rules:
+            rule_str = _strip_counts(str(rule))
+            rules_to_remove[rule_str] = rules_to_remove.get(rule_str, 0) + 1
+
         def _weed_out_removes(line):
             # We need to find exact matches here
             if line.startswith(':'):
@@ -553,23 +668,15 @@ class IptablesManager(object):
                 line = line.split(':')[1]
                 line = line.split('- [')[0]
                 line = line.strip()
-                for chain in remove_chains:
-                    if chain == line:
-                        remove_chains.remove(chain)
-                        return False
+                if line in chains_to_remove:
+                    chains_to_remove.remove(line)
+                    return False
             elif line.startswith('['):
                 # it's a rule
-                # ignore [packet:byte] counts at beginning of lines
-                line = line.split(']', 1)[1]
-                line = line.strip()
-                for rule in remove_rules:
-                    # ignore [packet:byte] counts at beginning of rules
-                    rule_str = str(rule)
-                    rule_str = rule_str.split(' ', 1)[1]
-                    rule_str = rule_str.strip()
-                    if rule_str == line:
-                        remove_rules.remove(rule)
-                        return False
+                line = _strip_counts(line)
+                if rules_to_remove.get(line):
+                    rules_to_remove[line] -= 1
+                    return False
 
             # Leave it alone
             return True
@@ -584,8 +691,7 @@ class IptablesManager(object):
 
         # flush lists, just in case we didn't find something
         remove_chains.clear()
-        for rule in remove_rules:
-            remove_rules.remove(rule)
+        del remove_rules[:]
 
         return new_filter
 
@@ -593,8 +699,17 @@ class IptablesManager(object):
 # NOTE(jkoelker) This is just a nice little stub point since mocking
 #                builtins with mox is a nightmare
 def write_to_file(file, data, mode='w'):
-    with open(file, mode) as f:
+    if mode != 'w':
+        with open(file, mode) as f:
+            f.write(data)
+        return
+
+    # Replace the file in one step so readers like dnsmasq never see it
+    # half written
+    tmpfile = '%s.tmp' % file
+    with open(tmpfile, mode) as f:
         f.write(data)
+    os.rename(tmpfile, file)
 
 
 def metadata_forward():
@@ -836,22 +951,32 @@ def get_dhcp_leases(context, network_ref):
     return '\n'.join(hosts)
 
 
-def get_dhcp_hosts(context, network_ref):
-    """Get network's hosts config in dhcp-host format."""
-    hosts = []
+def _get_dhcp_fixed_ips(context, network_ref, address=None):
+    """Return the fixed ips dnsmasq serves for a network on this host."""
     host = None
     if network_ref['multi_host']:
         host = CONF.host
+    return db.network_get_associated_fixed_ips(context,
+                                               network_ref['id'],
+                                               host=host,
+                                               address=address)
+
+
+def _dhcp_hosts_text(fixed_ips):
+    hosts = []
     macs = set()
-    for data in db.network_get_associated_fixed_ips(context,
-                                                    network_ref['id'],
-                                                    host=host):
+    for data in fixed_ips:
         if data['vif_address'] not in macs:
             hosts.append(_host_dhcp(data))
             macs.add(data['vif_address'])
     return '\n'.join(hosts)
 
 
+def get_dhcp_hosts(context, network_ref):
+    """Get network's hosts config in dhcp-host format."""
+    return _dhcp_hosts_text(_get_dhcp_fixed_ips(context, network_ref))
+
+
 def get_dns_hosts(context, network_ref):
     """Get network's DNS hosts in hosts format."""
     hosts = []
@@ -936,12 +1061,69 @@ def release_dhcp(dev, address, mac_address):
     utils.execute('dhcp_release', dev, address, mac_address, run_as_root=True)
 
 
+# NOTE(vish): The fixed ips in the host file of each device, by address,
+#             so that single allocations and releases can rewrite it
+#             without reading every fixed ip of the network again.
+_dhcp_fixed_ips = {}
+_dhcp_updates_pending = set()
+
+
 def update_dhcp(context, dev, network_ref):
+    fixed_ips = collections.OrderedDict(
+        (data['address'], data)
+        for data in _get_dhcp_fixed_ips(context, network_ref))
+    _dhcp_fixed_ips[dev] = fixed_ips
+    _dhcp_updates_pending.discard(dev)
+    conffile = _dhcp_file(dev, 'conf')
+    write_to_file(conffile, _dhcp_hosts_text(fixed_ips.values()))
+    restart_dhcp(context, dev, network_ref)
+
+
+def update_dhcp_host(context, dev, network_ref, address):
+    """Refresh the host file entry of a fixed ip just allocated or released.
+
+    The host file is rewritten and dnsmasq reloaded dnsmasq_reload_delay
+    seconds later, together with every other change made to the device
+    meanwhile. Falls back to update_dhcp if the device has not been set
+    up by this process yet.
+
+    """
+    fixed_ips = _dhcp_fixed_ips.get(dev)
+    if fixed_ips is None:
+        update_dhcp(context, dev, network_ref)
+        return
+
+    fixed_ips.pop(address, None)
+    for data in _get_dhcp_fixed_ips(context, network_ref, address=address):
+        fixed_ips[data['address']] = data
+
+    if CONF.dnsmasq_reload_delay <= 0:
+        _dhcp_updates_pending.add(dev)
+        _flush_dhcp_hosts(context, dev, network_ref)
+    elif dev not in _dhcp_updates_pending:
+        _dhcp_updates_pending.add(dev)
+        greenthread.spawn_after(CONF.dnsmasq_reload_delay,
+                                _delayed_flush_dhcp_hosts,
+                                context, dev, network_ref)
+
+
+def _flush_dhcp_hosts(context, dev, network_ref):
+    # Nothing to do if update_dhcp or kill_dhcp got here first
+    if dev not in _dhcp_updates_pending:
+        return
+    _dhcp_updates_pending.discard(dev)
     conffile = _dhcp_file(dev, 'conf')
-    write_to_file(conffile, get_dhcp_hosts(context, network_ref))
+    write_to_file(conffile, _dhcp_hosts_text(_dhcp_fixed_ips[dev].values()))
     restart_dhcp(context, dev, network_ref)
 
 
+def _delayed_flush_dhcp_hosts(context, dev, network_ref):
+    try:
+        _flush_dhcp_hosts(context, dev, network_ref)
+    except Exception:
+        LOG.exception(_('Failed to update dnsmasq hosts for %s'), dev)
+
+
 def update_dns(context, dev, network_ref):
     hostsfile = _dhcp_file(dev, 'hosts')
     write_to_file(hostsfile, get_dns_hosts(context, network_ref))
@@ -954,6 +1136,8 @@ def update_dhcp_hostfile_with_text(dev, hosts_text):
 
 
 def kill_dhcp(dev):
+    _dhcp_fixed_ips.pop(dev, None)
+    _dhcp_updates_pending.discard(dev)
     pid = _dnsmasq_pid_for(dev)
     if pid:
         # Check that the process exists and looks like a dnsmasq process
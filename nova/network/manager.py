@@ -46,6 +46,7 @@ import datetime
 import itertools
 import math
 import re
+import string
 import uuid
 
 from eventlet import greenpool
@@ -176,6 +177,33 @@ CONF.import_opt('my_ip', 'nova.netconf')
 CONF.import_opt('network_topic', 'nova.network.rpcapi')
 
 
+def _ip_filter_to_like(ip_filter):
+    """Translate an ip filter regex into an equivalent SQL LIKE pattern.
+
+    Only regexes made of address characters, '.' and '.*' translate;
+    returns None for anything else.  The pattern is open ended because the
+    filter is applied with re.match.
+    """
+    like = []
+    i = 0
+    while i < len(ip_filter):
+        char = ip_filter[i]
+        if ip_filter[i:i + 2] == '.*':
+            like.append('%')
+            i += 2
+            continue
+        if char == '.':
+            like.append('_')
+        elif char in string.hexdigits or char == ':':
+            like.append(char)
+        else:
+            return None
+        i += 1
+    if not like or like[-1] != '%':
+        like.append('%')
+    return ''.join(like)
+
+
 class RPCAllocateFixedIP(object):
     """Mixin class originally for FlatDCHP and VLAN network managers.
 
@@ -407,52 +435,59 @@ class NetworkManager(manager.Manager):
 
     def get_instance_uuids_by_ip_filter(self, context, filters):
         fixed_ip_filter = filters.get('fixed_ip')
-        ip_filter = re.compile(str(filters.get('ip')))
-        ipv6_filter = re.compile(str(filters.get('ip6')))
-
-        # NOTE(jkoelker) Should probably figure out a better way to do
-        #                this. But for now it "works", this could suck on
-        #                large installs.
-
-        vifs = self.db.virtual_interface_get_all(context)
+        ip_filter = filters.get('ip')
+        ipv6_filter = filters.get('ip6')
         results = []
 
-        for vif in vifs:
-            if vif['instance_uuid'] is None:
-                continue
-
-            network = self._get_network_by_id(context, vif['network_id'])
-            fixed_ipv6 = None
-            if network['cidr_v6'] is not None:
-                fixed_ipv6 = ipv6.to_global(network['cidr_v6'],
-                                            vif['address'],
-                                            context.project_id)
-
-            if fixed_ipv6 and ipv6_filter.match(fixed_ipv6):
-                results.append({'instance_uuid': vif['instance_uuid'],
-                                'ip': fixed_ipv6})
-
-            vif_id = vif['id']
-            fixed_ips = self.db.fixed_ips_by_virtual_interface(context,
-                                                               vif_id)
-            for fixed_ip in fixed_ips:
-                if not fixed_ip or not fixed_ip['address']:
+        if ipv6_filter is not None:
+            ipv6_filter = re.compile(str(ipv6_filter))
+            # NOTE: global ipv6 addresses are derived from the network's
+            # prefix and the vif's mac rather than stored, so they have to
+            # be computed here; look each network up only once.
+            cidrs_v6 = {}
+            for vif in self.db.virtual_interface_get_all(context):
+                if vif['instance_uuid'] is None:
                     continue
-                if fixed_ip['address'] == fixed_ip_filter:
-                    results.append({'instance_uuid': vif['instance_uuid'],
-                                    'ip': fixed_ip['address']})
+                network_id = vif['network_id']
+                if network_id not in cidrs_v6:
+                    network = self._get_network_by_id(context, network_id)
+                    cidrs_v6[network_id] = network['cidr_v6']
+                if cidrs_v6[network_id] is None:
                     continue
-                if ip_filter.match(fixed_ip['address']):
+                fixed_ipv6 = ipv6.to_global(cidrs_v6[network_id],
+                                            vif['address'],
+                                            context.project_id)
+                if fixed_ipv6 and ipv6_filter.match(fixed_ipv6):
                     results.append({'instance_uuid': vif['instance_uuid'],
-                                    'ip': fixed_ip['address']})
-                    continue
-                for floating_ip in fixed_ip.get('floating_ips', []):
-                    if not floating_ip or not floating_ip['address']:
-                        continue
-                    if ip_filter.match(floating_ip['address']):
-                        results.append({'instance_uuid': vif['instance_uuid'],
-                                        'ip': floating_ip['address']})
-                        continue
+                                    'ip': fixed_ipv6})
+
+        if fixed_ip_filter is None and ip_filter is None:
+            return results
+
+        # Exact and prefix matches are done by the database; anything
+        # else needs a single pass over every instance's fixed ips.
+        address = fixed_ip_filter
+        address_like = None
+        if ip_filter is not None:
+            address_like = _ip_filter_to_like(str(ip_filter))
+            if address_like is None:
+                address = None
+            ip_filter = re.compile(str(ip_filter))
+
+        fixed_ips = self.db.fixed_ip_get_by_address_filter(
+            context, address=address, address_like=address_like)
+        for fixed_ip in fixed_ips:
+            if (fixed_ip['address'] == fixed_ip_filter or
+                    (ip_filter and ip_filter.match(fixed_ip['address']))):
+                results.append({'instance_uuid': fixed_ip['instance_uuid'],
+                                'ip': fixed_ip['address']})
+                continue
+            if ip_filter is None:
+                continue
+            for floating_address in fixed_ip['floating_ips']:
+                if ip_filter.match(floating_address):
+                    results.append({'instance_uuid': fixed_ip['instance_uuid'],
+                                    'ip': floating_address})
 
         return results
 
@@ -869,7 +904,7 @@ class NetworkManager(manager.Manager):
                     name, address, "A", self.instance_dns_domain)
                 self.instance_dns_manager.create_entry(
                     instance_id, address, "A", self.instance_dns_domain)
-            self._setup_network_on_host(context, network)
+            self._setup_network_on_host(context, network, address=address)
 
             QUOTAS.commit(context, reservations)
             return address
@@ -937,7 +972,7 @@ class NetworkManager(manager.Manager):
                 #             callback will get called by nova-dhcpbridge.
                 self.driver.release_dhcp(dev, address, vif['address'])
 
-            self._teardown_network_on_host(context, network)
+            self._teardown_network_on_host(context, network, address=address)
 
         # Commit the reservations
         if reservations:
@@ -1290,14 +1325,27 @@ class NetworkManager(manager.Manager):
         network = self.db.network_get(context, network_id)
         call_func(context, network)
 
-    def _setup_network_on_host(self, context, network):
-        """Sets up network on this host."""
+    def _setup_network_on_host(self, context, network, address=None):
+        """Sets up network on this host.
+
+        address is the fixed ip that was just allocated, if any.
+        """
         raise NotImplementedError()
 
-    def _teardown_network_on_host(self, context, network):
-        """Sets up network on this host."""
+    def _teardown_network_on_host(self, context, network, address=None):
+        """Sets up network on this host.
+
+        address is the fixed ip that was just released, if any.
+        """
         raise NotImplementedError()
 
+    def _update_dhcp(self, context, dev, network, address=None):
+        """Update the dhcp hosts of a network, or only those of address."""
+        if address:
+            self.driver.update_dhcp_host(context, dev, network, address)
+        else:
+            self.driver.update_dhcp(context, dev, network)
+
     def validate_networks(self, context, networks):
         """check if the networks exists and host
         is set to each network.
@@ -1476,7 +1524,7 @@ class FlatManager(NetworkManager):
                                                      teardown)
         self.db.fixed_ip_disassociate(context, address)
 
-    def _setup_network_on_host(self, context, network):
+    def _setup_network_on_host(self, context, network, address=None):
         """Setup Network on this host."""
         # NOTE(tr3buchet): this does not need to happen on every ip
         # allocation, this functionality makes more sense in create_network
@@ -1485,7 +1533,7 @@ class FlatManager(NetworkManager):
         net['injected'] = CONF.flat_injected
         self.db.network_update(context, network['id'], net)
 
-    def _teardown_network_on_host(self, context, network):
+    def _teardown_network_on_host(self, context, network, address=None):
         """Tear down network on this host."""
         pass
 
@@ -1604,7 +1652,7 @@ class FlatDHCPManager(RPCAllocateFixedIP, floating_ips.FloatingIP,
         super(FlatDHCPManager, self).init_host()
         self.init_host_floating_ips()
 
-    def _setup_network_on_host(self, context, network):
+    def _setup_network_on_host(self, context, network, address=None):
         """Sets up network on this host."""
         network['dhcp_server'] = self._get_dhcp_ip(context, network)
 
@@ -1616,20 +1664,20 @@ class FlatDHCPManager(RPCAllocateFixedIP, floating_ips.FloatingIP,
             dev = self.driver.get_dev(network)
             # NOTE(dprince): dhcp DB queries require elevated context
             elevated = context.elevated()
-            self.driver.update_dhcp(elevated, dev, network)
+            self._update_dhcp(elevated, dev, network, address)
             if(CONF.use_ipv6):
                 self.driver.update_ra(context, dev, network)
                 gateway = utils.get_my_linklocal(dev)
                 self.db.network_update(context, network['id'],
                                        {'gateway_v6': gateway})
 
-    def _teardown_network_on_host(self, context, network):
+    def _teardown_network_on_host(self, context, network, address=None):
         if not CONF.fake_network:
             network['dhcp_server'] = self._get_dhcp_ip(context, network)
             dev = self.driver.get_dev(network)
             # NOTE(dprince): dhcp DB queries require elevated context
             elevated = context.elevated()
-            self.driver.update_dhcp(elevated, dev, network)
+            self._update_dhcp(elevated, dev, network, address)
 
     def _get_network_dict(self, network):
         """Returns the dict representing necessary and meta network fields."""
@@ -1725,7 +1773,7 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
                                                    "A",
                                                    self.instance_dns_domain)
 
-        self._setup_network_on_host(context, network)
+        self._setup_network_on_host(context, network, address=address)
         return address
 
     def add_network_to_project(self, context, project_id, network_uuid=None):
@@ -1810,7 +1858,7 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
             self, context, vpn=True, **kwargs)
 
     @lockutils.synchronized('setup_network', 'nova-', external=True)
-    def _setup_network_on_host(self, context, network):
+    def _setup_network_on_host(self, context, network, address=None):
         """Sets up network on this host."""
         if not network['vpn_public_address']:
             net = {}
@@ -1836,7 +1884,7 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
             dev = self.driver.get_dev(network)
             # NOTE(dprince): dhcp DB queries require elevated context
             elevated = context.elevated()
-            self.driver.update_dhcp(elevated, dev, network)
+            self._update_dhcp(elevated, dev, network, address)
             if(CONF.use_ipv6):
                 self.driver.update_ra(context, dev, network)
                 gateway = utils.get_my_linklocal(dev)
@@ -1844,13 +1892,13 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
                                        {'gateway_v6': gateway})
 
     @lockutils.synchronized('setup_network', 'nova-', external=True)
-    def _teardown_network_on_host(self, context, network):
+    def _teardown_network_on_host(self, context, network, address=None):
         if not CONF.fake_network:
             network['dhcp_server'] = self._get_dhcp_ip(context, network)
             dev = self.driver.get_dev(network)
             # NOTE(dprince): dhcp DB queries require elevated context
             elevated = context.elevated()
-            self.driver.update_dhcp(elevated, dev, network)
+            self._update_dhcp(elevated, dev, network, address)
 
             # NOTE(ethuleau): For multi hosted networks, if the network is no
             # more used on this host and if VPN forwarding rule aren't handed
@@ -1868,7 +1916,7 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
                               'host': None}
                     self.db.fixed_ip_update(context, network['dhcp_server'],
                                             values)
-            else:
+            elif not address:
                 self.driver.update_dhcp(context, dev, network)
 
     def _get_network_dict(self, network):
@@ -18,6 +18,9 @@
 
 """Super simple fake memcache client."""
 
+import collections
+import heapq
+
 from oslo.config import cfg
 
 from nova.openstack.common import timeutils
@@ -26,6 +29,11 @@ memcache_opts = [
     cfg.ListOpt('memcached_servers',
                 default=None,
                 help='Memcached servers or None for in process cache.'),
+    cfg.IntOpt('memorycache_max_size',
+               default=0,
+               help='Maximum number of keys in the in process cache, '
+                    'beyond which the least recently used keys are '
+                    'evicted.  0 means no limit.'),
 ]
 
 CONF = cfg.CONF
@@ -52,27 +60,58 @@ class Client(object):
 
     def __init__(self, *args, **kwargs):
         """Ignores the passed in args."""
-        self.cache = {}
+        # Kept in least recently used first order.
+        self.cache = collections.OrderedDict()
+        # Heap of (timeout, key) for the keys set with a timeout, so that
+        # expired keys are found without looking at every key.  Entries
+        # for keys that were set again or deleted since are skipped.
+        self.timeouts = []
+        self.max_size = CONF.memorycache_max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expunge(self):
+        """Deletes the keys that have expired."""
+        now = timeutils.utcnow_ts()
+        timeouts = self.timeouts
+        while timeouts and timeouts[0][0] <= now:
+            timeout, key = heapq.heappop(timeouts)
+            entry = self.cache.get(key)
+            if entry is not None and entry[0] == timeout:
+                del self.cache[key]
 
     def get(self, key):
         """Retrieves the value for a key or None.
 
         this expunges expired keys during each get"""
 
-        now = timeutils.utcnow_ts()
-        for k in self.cache.keys():
-            (timeout, _value) = self.cache[k]
-            if timeout and now >= timeout:
-                del self.cache[k]
-
-        return self.cache.get(key, (0, None))[1]
+        self._expunge()
+        entry = self.cache.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        # Move the key to the most recently used end.
+        self.cache[key] = entry
+        self.hits += 1
+        return entry[1]
 
     def set(self, key, value, time=0, min_compress_len=0):
         """Sets the value for a key."""
         timeout = 0
         if time != 0:
             timeout = timeutils.utcnow_ts() + time
+            heapq.heappush(self.timeouts, (timeout, key))
+            if len(self.timeouts) > 2 * len(self.cache) + 100:
+                # Drop the entries of keys that were set again or deleted.
+                self.timeouts = [(t, k) for k, (t, _value)
+                                 in self.cache.iteritems() if t]
+                heapq.heapify(self.timeouts)
+        self.cache.pop(key, None)
         self.cache[key] = (timeout, value)
+        if self.max_size and len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+            self.evictions += 1
         return True
 
     def add(self, key, value, time=0, min_compress_len=0):
@@ -94,3 +133,10 @@ class Client(object):
         """Deletes the value associated with a key."""
         if key in self.cache:
             del self.cache[key]
+
+    def get_stats(self):
+        """Returns the cache statistics, named as memcached's."""
+        return [('memorycache', {'curr_items': len(self.cache),
+                                 'get_hits': self.hits,
+                                 'get_misses': self.misses,
+                                 'evictions': self.evictions})]
@@ -0,0 +1,92 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Client side of the long-lived root wrapper."""
+
+import json
+
+from eventlet.green import socket
+from eventlet.green import subprocess
+from eventlet import semaphore
+
+from nova.openstack.common.rootwrap import daemon
+
+
+class DaemonStartError(Exception):
+    """Raised when the root wrapper daemon could not be started."""
+    pass
+
+
+class Client(object):
+    """Runs commands through a root wrapper daemon it starts on first use.
+
+    The daemon is started again if it has died since the last command.
+    """
+
+    def __init__(self, daemon_cmd):
+        self._daemon_cmd = daemon_cmd
+        self._process = None
+        self._path = None
+        self._lock = semaphore.Semaphore()
+
+    def _ensure_daemon(self):
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                return self._path
+            self._process = subprocess.Popen(self._daemon_cmd,
+                                             stdin=subprocess.PIPE,
+                                             stdout=subprocess.PIPE,
+                                             close_fds=True)
+            self._path = self._process.stdout.readline().strip()
+            if not self._path:
+                returncode = self._process.wait()
+                self._process = None
+                raise DaemonStartError('%s exited with %s' %
+                                       (' '.join(self._daemon_cmd),
+                                        returncode))
+            return self._path
+
+    def execute(self, cmd, process_input=None):
+        """Returns a (returncode, stdout, stderr) tuple for cmd."""
+        path = self._ensure_daemon()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+            daemon.send_frame(sock, 'c', json.dumps(cmd))
+            if process_input:
+                daemon.send_frame(sock, 'i', process_input)
+            daemon.send_frame(sock, 'd')
+
+            output = {'o': [], 'e': []}
+            while True:
+                frame_type, payload = daemon.recv_frame(sock)
+                if frame_type == 'r':
+                    return (int(payload), ''.join(output['o']),
+                            ''.join(output['e']))
+                if frame_type not in output:
+                    raise daemon.ProtocolError('Unexpected frame type %r'
+                                               % frame_type)
+                output[frame_type].append(payload)
+        finally:
+            sock.close()
+
+    def stop(self):
+        with self._lock:
+            if self._process is not None:
+                self._process.stdin.close()
+                self._process.wait()
+                self._process = None
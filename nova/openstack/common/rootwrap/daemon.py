@@ -0,0 +1,232 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Long-lived root wrapper
+
+   Runs commands on behalf of a single unprivileged client, authorized by
+   the same filters as the one-shot root wrapper, without paying for a new
+   sudo and Python interpreter on every command.
+
+   The daemon listens on a UNIX socket in a fresh directory only the user
+   that started it (through sudo) can enter, and prints the socket path as
+   the first line of its stdout.  It exits when its stdin is closed, so it
+   never outlives the service that spawned it.
+
+   Each connection runs one command.  Messages in both directions are
+   frames of a one byte type, a four byte big-endian length and a payload:
+
+     client: 'c' json encoded argument list, 'i' stdin data (any number),
+             'd' end of request
+     daemon: 'o' stdout data, 'e' stderr data (any number, as produced),
+             'r' return code in decimal, last
+"""
+
+import json
+import logging
+import os
+import select
+import shutil
+import signal
+import SocketServer
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+
+from nova.openstack.common.rootwrap import wrapper
+
+
+RC_UNAUTHORIZED = 99
+RC_NOEXECFOUND = 96
+
+FRAME_HEADER = struct.Struct('!cI')
+READ_SIZE = 65536
+
+
+class ProtocolError(Exception):
+    """Raised when a peer sends a malformed or truncated frame."""
+    pass
+
+
+def _recv_exactly(sock, size):
+    data = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ProtocolError('Connection closed mid-frame')
+        data.append(chunk)
+        size -= len(chunk)
+    return ''.join(data)
+
+
+def send_frame(sock, frame_type, payload=''):
+    sock.sendall(FRAME_HEADER.pack(frame_type, len(payload)) + payload)
+
+
+def recv_frame(sock):
+    """Returns a (type, payload) tuple, or (None, None) on a clean EOF."""
+    header = sock.recv(FRAME_HEADER.size)
+    if not header:
+        return None, None
+    if len(header) < FRAME_HEADER.size:
+        header += _recv_exactly(sock, FRAME_HEADER.size - len(header))
+    frame_type, size = FRAME_HEADER.unpack(header)
+    return frame_type, _recv_exactly(sock, size)
+
+
+def _subprocess_setup():
+    # Python installs a SIGPIPE handler by default. This is usually not what
+    # non-Python subprocesses expect.
+    signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+
+
+def _feed_stdin(stdin, data):
+    try:
+        if data:
+            stdin.write(data)
+    except IOError:
+        # The command exited without reading all of its input
+        pass
+    finally:
+        stdin.close()
+
+
+class RootwrapHandler(SocketServer.BaseRequestHandler):
+
+    def handle(self):
+        userargs = None
+        stdin = []
+        while True:
+            frame_type, payload = recv_frame(self.request)
+            if frame_type is None or frame_type == 'd':
+                break
+            if frame_type == 'c':
+                userargs = [arg.encode('utf-8') for arg in json.loads(payload)]
+            elif frame_type == 'i':
+                stdin.append(payload)
+            else:
+                raise ProtocolError('Unexpected frame type %r' % frame_type)
+        if not userargs:
+            return
+        self.run(userargs, ''.join(stdin))
+
+    def _refuse(self, message, returncode):
+        if self.server.config.use_syslog:
+            logging.error(message)
+        send_frame(self.request, 'o', 'nova-rootwrap-daemon: %s\n' % message)
+        send_frame(self.request, 'r', str(returncode))
+
+    def run(self, userargs, stdin):
+        config = self.server.config
+        try:
+            filtermatch = wrapper.match_filter(self.server.filters, userargs,
+                                               exec_dirs=config.exec_dirs)
+        except wrapper.FilterMatchNotExecutable as exc:
+            self._refuse("Executable not found: %s (filter match = %s)"
+                         % (exc.match.exec_path, exc.match.name),
+                         RC_NOEXECFOUND)
+            return
+        except wrapper.NoFilterMatched:
+            self._refuse("Unauthorized command: %s (no filter matched)"
+                         % ' '.join(userargs), RC_UNAUTHORIZED)
+            return
+
+        command = filtermatch.get_command(userargs,
+                                          exec_dirs=config.exec_dirs)
+        if config.use_syslog:
+            logging.info("(uid %s) Executing %s (filter match = %s)" % (
+                self.server.client_uid, command, filtermatch.name))
+
+        obj = subprocess.Popen(command,
+                               stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE,
+                               close_fds=True,
+                               preexec_fn=_subprocess_setup,
+                               env=filtermatch.get_environment(userargs))
+        feeder = threading.Thread(target=_feed_stdin, args=(obj.stdin, stdin))
+        feeder.start()
+
+        # Forward output as it is produced rather than buffering it, so
+        # large outputs are not held in the daemon.
+        streams = {obj.stdout.fileno(): 'o', obj.stderr.fileno(): 'e'}
+        while streams:
+            readable, _w, _x = select.select(list(streams), [], [])
+            for fd in readable:
+                data = os.read(fd, READ_SIZE)
+                if data:
+                    send_frame(self.request, streams[fd], data)
+                else:
+                    del streams[fd]
+
+        feeder.join()
+        obj.stdout.close()
+        obj.stderr.close()
+        send_frame(self.request, 'r', str(obj.wait()))
+
+
+class RootwrapServer(SocketServer.ThreadingMixIn,
+                     SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, config, filters, client_uid):
+        SocketServer.UnixStreamServer.__init__(self, path, RootwrapHandler)
+        self.config = config
+        self.filters = filters
+        self.client_uid = client_uid
+
+    def handle_error(self, request, client_address):
+        logging.exception("Failed to handle rootwrap request")
+
+
+def _client_ids():
+    """Returns the uid and gid of the user who started us through sudo."""
+    uid = int(os.environ.get('SUDO_UID', os.getuid()))
+    gid = int(os.environ.get('SUDO_GID', os.getgid()))
+    return uid, gid
+
+
+def _wait_for_parent(server):
+    # Our stdin is a pipe held by the client; EOF means it went away.
+    while sys.stdin.read(READ_SIZE):
+        pass
+    server.shutdown()
+
+
+def daemon_start(config, filters):
+    """Serve commands matching filters until stdin is closed."""
+    uid, gid = _client_ids()
+    tmpdir = tempfile.mkdtemp(prefix='rootwrap-')
+    try:
+        os.chmod(tmpdir, 0o700)
+        os.chown(tmpdir, uid, gid)
+        path = os.path.join(tmpdir, 'rootwrap.sock')
+        server = RootwrapServer(path, config, filters, uid)
+        os.chmod(path, 0o600)
+        os.chown(path, uid, gid)
+
+        watcher = threading.Thread(target=_wait_for_parent, args=(server,))
+        watcher.daemon = True
+        watcher.start()
+
+        sys.stdout.write(path + '\n')
+        sys.stdout.flush()
+        server.serve_forever()
+        server.server_close()
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
@@ -19,6 +19,7 @@ You can customize this scheduler by specifying your own Host Filters and
 Weighing Functions.
 """
 
+import heapq
 import random
 
 from oslo.config import cfg
@@ -29,6 +30,7 @@ from nova.openstack.common import log as logging
 from nova.openstack.common.notifier import api as notifier
 from nova.scheduler import driver
 from nova.scheduler import scheduler_options
+from nova.scheduler import stats as scheduler_stats
 
 CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
@@ -43,7 +45,15 @@ filter_scheduler_opts = [
                     'chosen from. A value of 1 chooses the '
                     'first host returned by the weighing functions. '
                     'This value must be at least 1. Any value less than 1 '
-                    'will be ignored, and 1 will be used instead')
+                    'will be ignored, and 1 will be used instead'),
+    cfg.BoolOpt('scheduler_bulk_placement',
+                default=False,
+                help='When scheduling several instances in one request, '
+                     'filter and weigh all hosts only once, and afterwards '
+                     'only re-filter and re-weigh the host chosen for the '
+                     'previous instance. This assumes that the result of '
+                     'every filter and weigher for a host only depends on '
+                     'that host.'),
 ]
 
 CONF.register_opts(filter_scheduler_opts)
@@ -297,6 +307,10 @@ class FilterScheduler(driver.Scheduler):
             configured_hosts = filter_properties['group_hosts']
             filter_properties['group_hosts'] = configured_hosts + group_hosts
 
+        # Hosts named by the affinity hints are looked up once per request
+        # by the affinity filters; drop any result from a previous attempt.
+        filter_properties.pop('affinity_hosts', None)
+
         config_options = self._get_configuration_options()
 
         # check retry policy.  Rather ugly use of instance_uuids[0]...
@@ -315,21 +329,46 @@ class FilterScheduler(driver.Scheduler):
         self.populate_filter_properties(request_spec,
                                         filter_properties)
 
-        # Find our local list of acceptable hosts by repeatedly
-        # filtering and weighing our options. Each time we choose a
-        # host, we virtually consume resources on it so subsequent
-        # selections can adjust accordingly.
-
-        # Note: remember, we are using an iterator here. So only
-        # traverse this list once. This can bite you if the hosts
-        # are being scanned in a filter or weighing function.
-        hosts = self.host_manager.get_all_host_states(elevated)
-
-        selected_hosts = []
         if instance_uuids:
             num_instances = len(instance_uuids)
         else:
             num_instances = request_spec.get('num_instances', 1)
+
+        stats = None
+        if CONF.scheduler_collect_stats:
+            stats = scheduler_stats.SchedulerStats()
+            filter_properties['scheduler_stats'] = stats
+
+        try:
+            # Note: remember, we are using an iterator here. So only
+            # traverse this list once. This can bite you if the hosts
+            # are being scanned in a filter or weighing function.
+            hosts = self.host_manager.get_all_host_states(elevated,
+                                                          stats=stats)
+
+            if CONF.scheduler_bulk_placement:
+                select_hosts = self._bulk_select_hosts
+            else:
+                select_hosts = self._select_hosts
+            return select_hosts(hosts, filter_properties,
+                                instance_properties, num_instances,
+                                update_group_hosts)
+        finally:
+            if stats is not None:
+                # The stats must not be passed on to the compute hosts.
+                del filter_properties['scheduler_stats']
+                stats.report(context, instance_uuids)
+
+    def _select_hosts(self, hosts, filter_properties, instance_properties,
+                      num_instances, update_group_hosts):
+        """Select hosts for num_instances instances.
+
+        Find our local list of acceptable hosts by repeatedly filtering
+        and weighing our options. Each time we choose a host, we virtually
+        consume resources on it so subsequent selections can adjust
+        accordingly.
+        """
+        selected_hosts = []
         for num in xrange(num_instances):
             # Filter local hosts based on requirements ...
             hosts = self.host_manager.get_filtered_hosts(hosts,
@@ -361,6 +400,68 @@ class FilterScheduler(driver.Scheduler):
                 filter_properties['group_hosts'].append(chosen_host.obj.host)
         return selected_hosts
 
+    def _bulk_select_hosts(self, hosts, filter_properties,
+                           instance_properties, num_instances,
+                           update_group_hosts):
+        """Select hosts for num_instances instances, filtering and weighing
+        all the hosts only once.
+
+        The weighed hosts are kept in a heap.  Consuming resources for an
+        instance only changes the chosen host, so only that host is filtered
+        and weighed again before it goes back in the heap.
+        """
+        hosts = self.host_manager.get_filtered_hosts(hosts,
+                filter_properties)
+        LOG.debug(_("Filtered %(hosts)s") % locals())
+        weighed_hosts = self.host_manager.get_weighed_hosts(hosts,
+                filter_properties)
+
+        # heapq is a min-heap, so the weights are negated.  The sequence
+        # number keeps hosts of equal weight in their weighed order.
+        heap = [(-weighed_host.weight, seq, weighed_host)
+                for seq, weighed_host in enumerate(weighed_hosts)]
+        heapq.heapify(heap)
+        seq = len(heap)
+
+        selected_hosts = []
+        for num in xrange(num_instances):
+            if not heap:
+                # Can't get any more locally.
+                break
+
+            scheduler_host_subset_size = CONF.scheduler_host_subset_size
+            if scheduler_host_subset_size > len(heap):
+                scheduler_host_subset_size = len(heap)
+            if scheduler_host_subset_size < 1:
+                scheduler_host_subset_size = 1
+
+            subset = [heapq.heappop(heap)
+                      for i in xrange(scheduler_host_subset_size)]
+            chosen = random.choice(subset)
+            for entry in subset:
+                if entry is not chosen:
+                    heapq.heappush(heap, entry)
+
+            chosen_host = chosen[2]
+            LOG.debug(_("Choosing host %(chosen_host)s") % locals())
+            selected_hosts.append(chosen_host)
+
+            # Now consume the resources and re-evaluate the chosen host
+            # for the next instance.
+            chosen_host.obj.consume_from_instance(instance_properties)
+            if update_group_hosts is True:
+                filter_properties['group_hosts'].append(chosen_host.obj.host)
+
+            if not self.host_manager.get_filtered_hosts([chosen_host.obj],
+                                                        filter_properties):
+                continue
+            reweighed_host = self.host_manager.get_weighed_hosts(
+                    [chosen_host.obj], filter_properties)[0]
+            heapq.heappush(heap, (-reweighed_host.weight, seq,
+                                  reweighed_host))
+            seq += 1
+        return selected_hosts
+
     def _assert_compute_node_has_enough_memory(self, context,
                                               instance_ref, dest):
         """Checks if destination host has enough memory for live migration.
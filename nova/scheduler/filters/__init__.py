@@ -37,8 +37,60 @@ class BaseHostFilter(filters.BaseFilter):
 
 
 class HostFilterHandler(filters.BaseFilterHandler):
+    # Weight of the past runs of a filter in its measured cost and pass
+    # rate, so that both follow changes in the hosts and requests.
+    cost_decay = 0.9
+
     def __init__(self):
         super(HostFilterHandler, self).__init__(BaseHostFilter)
+        # {filter class name: [hosts seen, hosts passed, seconds spent]}
+        self.filter_costs = {}
+
+    def record_filter_run(self, filter_cls, elapsed, hosts_in, hosts_out):
+        """Add a run of a filter to its measured cost and pass rate."""
+        costs = self.filter_costs.setdefault(filter_cls.__name__,
+                                             [0.0, 0.0, 0.0])
+        costs[0] = costs[0] * self.cost_decay + hosts_in
+        costs[1] = costs[1] * self.cost_decay + hosts_out
+        costs[2] = costs[2] * self.cost_decay + elapsed
+
+    def _filter_rank(self, filter_cls):
+        """Expected time spent in a filter for each host it rejects.
+
+        Running filters by increasing rank minimizes the expected time to
+        filter a host.  Filters that have not seen any host yet rank first,
+        so that they get measured.
+        """
+        costs = self.filter_costs.get(filter_cls.__name__)
+        if not costs or not costs[0]:
+            return 0.0
+        hosts_in, hosts_out, elapsed = costs
+        rejected = hosts_in - hosts_out
+        if rejected <= 0:
+            return float('inf')
+        return elapsed / rejected
+
+    def order_filters(self, filter_classes, pinned_filters=None):
+        """Return the filter classes with the cheapest and most selective
+        filters first.
+
+        Filters named in pinned_filters keep their position, and the other
+        filters are only reordered between them.  Filters are predicates
+        over each host on its own, so the order does not change which
+        hosts pass.
+        """
+        pinned_filters = pinned_filters or []
+        ordered = []
+        segment = []
+        for filter_cls in filter_classes:
+            if filter_cls.__name__ in pinned_filters:
+                ordered.extend(sorted(segment, key=self._filter_rank))
+                ordered.append(filter_cls)
+                segment = []
+            else:
+                segment.append(filter_cls)
+        ordered.extend(sorted(segment, key=self._filter_rank))
+        return ordered
 
 
 def all_filters():
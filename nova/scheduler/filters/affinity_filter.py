@@ -28,22 +28,40 @@ class AffinityFilter(filters.BaseHostFilter):
     def __init__(self):
         self.compute_api = compute.API()
 
+    def _affinity_hosts(self, filter_properties, hint):
+        """Return the set of hosts running the instances named by the
+        given scheduler hint, or None if the hint was not supplied.
+
+        The lookup is done once per scheduling request and cached in
+        filter_properties, so that every host only does a set lookup.
+        """
+        scheduler_hints = filter_properties.get('scheduler_hints') or {}
+        affinity_uuids = scheduler_hints.get(hint, [])
+        if isinstance(affinity_uuids, basestring):
+            affinity_uuids = [affinity_uuids]
+        if not affinity_uuids:
+            return None
+
+        affinity_hosts = filter_properties.setdefault('affinity_hosts', {})
+        if hint not in affinity_hosts:
+            context = filter_properties['context']
+            instances = self.compute_api.get_all(context,
+                                                 {'uuid': affinity_uuids,
+                                                  'deleted': False})
+            affinity_hosts[hint] = set(instance['host']
+                                       for instance in instances
+                                       if instance['host'] is not None)
+        return affinity_hosts[hint]
+
 
 class DifferentHostFilter(AffinityFilter):
     '''Schedule the instance on a different host from a set of instances.'''
 
     def host_passes(self, host_state, filter_properties):
-        context = filter_properties['context']
-        scheduler_hints = filter_properties.get('scheduler_hints') or {}
-
-        affinity_uuids = scheduler_hints.get('different_host', [])
-        if isinstance(affinity_uuids, basestring):
-            affinity_uuids = [affinity_uuids]
-        if affinity_uuids:
-            return not self.compute_api.get_all(context,
-                                                {'host': host_state.host,
-                                                 'uuid': affinity_uuids,
-                                                 'deleted': False})
+        affinity_hosts = self._affinity_hosts(filter_properties,
+                                              'different_host')
+        if affinity_hosts is not None:
+            return host_state.host not in affinity_hosts
         # With no different_host key
         return True
 
@@ -54,16 +72,9 @@ class SameHostFilter(AffinityFilter):
     '''
 
     def host_passes(self, host_state, filter_properties):
-        context = filter_properties['context']
-        scheduler_hints = filter_properties.get('scheduler_hints') or {}
-
-        affinity_uuids = scheduler_hints.get('same_host', [])
-        if isinstance(affinity_uuids, basestring):
-            affinity_uuids = [affinity_uuids]
-        if affinity_uuids:
-            return self.compute_api.get_all(context, {'host': host_state.host,
-                                                      'uuid': affinity_uuids,
-                                                      'deleted': False})
+        affinity_hosts = self._affinity_hosts(filter_properties, 'same_host')
+        if affinity_hosts is not None:
+            return host_state.host in affinity_hosts
         # With no same_host key
         return True
 
@@ -90,8 +101,15 @@ class GroupAntiAffinityFilter(AffinityFilter):
     instances.
     """
 
-    def host_passes(self, host_state, filter_properties):
-        group_hosts = filter_properties.get('group_hosts') or []
+    def filter_all(self, filter_obj_list, filter_properties):
+        # NOTE: Build the set of group hosts once per pass rather than
+        # scanning the list for every host.
+        group_hosts = set(filter_properties.get('group_hosts') or [])
+        for obj in filter_obj_list:
+            if self._host_passes(obj, group_hosts):
+                yield obj
+
+    def _host_passes(self, host_state, group_hosts):
         LOG.debug(_("Group affinity: %(host)s in %(configured)s"),
                     {'host': host_state.host,
                      'configured': group_hosts})
@@ -100,3 +118,7 @@ class GroupAntiAffinityFilter(AffinityFilter):
 
         # No groups configured
         return True
+
+    def host_passes(self, host_state, filter_properties):
+        group_hosts = filter_properties.get('group_hosts') or []
+        return self._host_passes(host_state, set(group_hosts))
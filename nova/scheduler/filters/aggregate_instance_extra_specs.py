@@ -14,10 +14,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from nova import db
 from nova.openstack.common import log as logging
 from nova.scheduler import filters
 from nova.scheduler.filters import extra_specs_ops
+from nova.scheduler.filters import utils
 
 
 LOG = logging.getLogger(__name__)
@@ -36,8 +36,8 @@ class AggregateInstanceExtraSpecsFilter(filters.BaseHostFilter):
         if 'extra_specs' not in instance_type:
             return True
 
-        context = filter_properties['context'].elevated()
-        metadata = db.aggregate_metadata_get_by_host(context, host_state.host)
+        context = filter_properties['context']
+        metadata = utils.aggregate_metadata_get_by_host(context, host_state)
 
         for key, req in instance_type['extra_specs'].iteritems():
             # NOTE(jogo) any key containing a scope (scope is terminated
@@ -33,19 +33,41 @@ CONF.register_opt(cpu_allocation_ratio_opt)
 class CoreFilter(filters.BaseHostFilter):
     """CoreFilter filters based on CPU core utilization."""
 
+    def filter_all(self, filter_obj_list, filter_properties):
+        # NOTE: Look up the request and the allocation ratio once per pass
+        # rather than once per host, and not at all if no hosts are left.
+        filter_obj_list = list(filter_obj_list)
+        if not filter_obj_list:
+            return
+
+        instance_type = filter_properties.get('instance_type')
+        if not instance_type:
+            for obj in filter_obj_list:
+                yield obj
+            return
+
+        instance_vcpus = instance_type['vcpus']
+        cpu_allocation_ratio = CONF.cpu_allocation_ratio
+        for obj in filter_obj_list:
+            if self._host_passes(obj, instance_vcpus, cpu_allocation_ratio):
+                yield obj
+
     def host_passes(self, host_state, filter_properties):
         """Return True if host has sufficient CPU cores."""
         instance_type = filter_properties.get('instance_type')
         if not instance_type:
             return True
 
+        return self._host_passes(host_state, instance_type['vcpus'],
+                                 CONF.cpu_allocation_ratio)
+
+    def _host_passes(self, host_state, instance_vcpus, cpu_allocation_ratio):
         if not host_state.vcpus_total:
             # Fail safe
             LOG.warning(_("VCPUs not set; assuming CPU collection broken"))
             return True
 
-        instance_vcpus = instance_type['vcpus']
-        vcpus_total = host_state.vcpus_total * CONF.cpu_allocation_ratio
+        vcpus_total = host_state.vcpus_total * cpu_allocation_ratio
 
         # Only provide a VCPU limit to compute if the virt driver is reporting
         # an accurate count of installed VCPUs. (XenServer driver does not)
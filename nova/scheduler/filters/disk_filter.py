@@ -30,16 +30,35 @@ CONF.register_opt(disk_allocation_ratio_opt)
 class DiskFilter(filters.BaseHostFilter):
     """Disk Filter with over subscription flag."""
 
+    def _requested_disk(self, filter_properties):
+        instance_type = filter_properties.get('instance_type')
+        return 1024 * (instance_type['root_gb'] +
+                       instance_type['ephemeral_gb'])
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        # NOTE: Look up the request and the allocation ratio once per pass
+        # rather than once per host, and not at all if no hosts are left.
+        filter_obj_list = list(filter_obj_list)
+        if not filter_obj_list:
+            return
+
+        requested_disk = self._requested_disk(filter_properties)
+        disk_allocation_ratio = CONF.disk_allocation_ratio
+        for obj in filter_obj_list:
+            if self._host_passes(obj, requested_disk, disk_allocation_ratio):
+                yield obj
+
     def host_passes(self, host_state, filter_properties):
         """Filter based on disk usage."""
-        instance_type = filter_properties.get('instance_type')
-        requested_disk = 1024 * (instance_type['root_gb'] +
-                                 instance_type['ephemeral_gb'])
+        return self._host_passes(host_state,
+                                 self._requested_disk(filter_properties),
+                                 CONF.disk_allocation_ratio)
 
+    def _host_passes(self, host_state, requested_disk, disk_allocation_ratio):
         free_disk_mb = host_state.free_disk_mb
         total_usable_disk_mb = host_state.total_usable_disk_gb * 1024
 
-        disk_mb_limit = total_usable_disk_mb * CONF.disk_allocation_ratio
+        disk_mb_limit = total_usable_disk_mb * disk_allocation_ratio
         used_disk_mb = total_usable_disk_mb - free_disk_mb
         usable_disk_mb = disk_mb_limit - used_disk_mb
 
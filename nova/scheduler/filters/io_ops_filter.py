@@ -31,12 +31,26 @@ CONF.register_opt(max_io_ops_per_host_opt)
 class IoOpsFilter(filters.BaseHostFilter):
     """Filter out hosts with too many concurrent I/O operations."""
 
+    def filter_all(self, filter_obj_list, filter_properties):
+        # NOTE: Look up the limit once per pass rather than once per host,
+        # and not at all if no hosts are left.
+        filter_obj_list = list(filter_obj_list)
+        if not filter_obj_list:
+            return
+
+        max_io_ops = CONF.max_io_ops_per_host
+        for obj in filter_obj_list:
+            if self._host_passes(obj, max_io_ops):
+                yield obj
+
     def host_passes(self, host_state, filter_properties):
         """Use information about current vm and task states collected from
         compute node statistics to decide whether to filter.
         """
+        return self._host_passes(host_state, CONF.max_io_ops_per_host)
+
+    def _host_passes(self, host_state, max_io_ops):
         num_io_ops = host_state.num_io_ops
-        max_io_ops = CONF.max_io_ops_per_host
         passes = num_io_ops < max_io_ops
         if not passes:
             LOG.debug(_("%(host_state)s fails I/O ops check: Max IOs per host "
@@ -31,9 +31,23 @@ CONF.register_opt(max_instances_per_host_opt)
 class NumInstancesFilter(filters.BaseHostFilter):
     """Filter out hosts with too many instances."""
 
+    def filter_all(self, filter_obj_list, filter_properties):
+        # NOTE: Look up the limit once per pass rather than once per host,
+        # and not at all if no hosts are left.
+        filter_obj_list = list(filter_obj_list)
+        if not filter_obj_list:
+            return
+
+        max_instances = CONF.max_instances_per_host
+        for obj in filter_obj_list:
+            if self._host_passes(obj, max_instances):
+                yield obj
+
     def host_passes(self, host_state, filter_properties):
+        return self._host_passes(host_state, CONF.max_instances_per_host)
+
+    def _host_passes(self, host_state, max_instances):
         num_instances = host_state.num_instances
-        max_instances = CONF.max_instances_per_host
         passes = num_instances < max_instances
         if not passes:
             LOG.debug(_("%(host_state)s fails num_instances check: Max "
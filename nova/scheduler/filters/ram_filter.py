@@ -32,14 +32,31 @@ CONF.register_opt(ram_allocation_ratio_opt)
 class RamFilter(filters.BaseHostFilter):
     """Ram Filter with over subscription flag."""
 
+    def filter_all(self, filter_obj_list, filter_properties):
+        # NOTE: Look up the request and the allocation ratio once per pass
+        # rather than once per host, and not at all if no hosts are left.
+        filter_obj_list = list(filter_obj_list)
+        if not filter_obj_list:
+            return
+
+        instance_type = filter_properties.get('instance_type')
+        requested_ram = instance_type['memory_mb']
+        ram_allocation_ratio = CONF.ram_allocation_ratio
+        for obj in filter_obj_list:
+            if self._host_passes(obj, requested_ram, ram_allocation_ratio):
+                yield obj
+
     def host_passes(self, host_state, filter_properties):
         """Only return hosts with sufficient available RAM."""
         instance_type = filter_properties.get('instance_type')
-        requested_ram = instance_type['memory_mb']
+        return self._host_passes(host_state, instance_type['memory_mb'],
+                                 CONF.ram_allocation_ratio)
+
+    def _host_passes(self, host_state, requested_ram, ram_allocation_ratio):
         free_ram_mb = host_state.free_ram_mb
         total_usable_ram_mb = host_state.total_usable_ram_mb
 
-        memory_mb_limit = total_usable_ram_mb * CONF.ram_allocation_ratio
+        memory_mb_limit = total_usable_ram_mb * ram_allocation_ratio
         used_ram_mb = total_usable_ram_mb - free_ram_mb
         usable_ram = memory_mb_limit - used_ram_mb
         if not usable_ram >= requested_ram:
@@ -48,6 +48,9 @@ import httplib
 import socket
 import ssl
 
+import eventlet
+from eventlet import pools
+from eventlet import semaphore
 from oslo.config import cfg
 
 from nova import context
@@ -56,6 +59,7 @@ from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
 from nova.scheduler import filters
+from nova import utils
 
 LOG = logging.getLogger(__name__)
 
@@ -84,6 +88,17 @@ trusted_opts = [
     cfg.IntOpt('attestation_auth_timeout',
                default=60,
                help='Attestation status cache valid period length'),
+    cfg.IntOpt('attestation_max_connections',
+               default=4,
+               help='Maximum number of persistent connections to the '
+                    'attestation server, and so of batched attestation '
+                    'requests issued concurrently'),
+    cfg.IntOpt('attestation_refresh_interval',
+               default=0,
+               help='Interval in seconds at which the attestation cache '
+                    'is refreshed in the background. Should be shorter than '
+                    'attestation_auth_timeout. With 0 hosts are attested '
+                    'when the scheduler finds their cache entry expired'),
 ]
 
 CONF = cfg.CONF
@@ -125,6 +140,21 @@ class HTTPSClientAuthConnection(httplib.HTTPSConnection):
                                     cert_reqs=ssl.CERT_REQUIRED)
 
 
+class HTTPSClientAuthConnectionPool(pools.Pool):
+    """Pool of persistent connections to the attestation server."""
+
+    def __init__(self, service, max_size):
+        self.service = service
+        super(HTTPSClientAuthConnectionPool, self).__init__(max_size=max_size)
+
+    def create(self):
+        return HTTPSClientAuthConnection(self.service.host,
+                                         self.service.port,
+                                         key_file=self.service.key_file,
+                                         cert_file=self.service.cert_file,
+                                         ca_file=self.service.ca_file)
+
+
 class AttestationService(object):
     # Provide access wrapper to attestation server to get integrity report.
 
@@ -137,30 +167,42 @@ class AttestationService(object):
         self.cert_file = None
         self.ca_file = CONF.trusted_computing.attestation_server_ca_file
         self.request_count = 100
+        self.max_connections = (
+                CONF.trusted_computing.attestation_max_connections)
+        self.connection_pool = HTTPSClientAuthConnectionPool(
+                self, self.max_connections)
 
     def _do_request(self, method, action_url, body, headers):
-        # Connects to the server and issues a request.
-        # :returns: result data
-        # :raises: IOError if the request fails
+        # Issues a request on a pooled connection to the server.
+        # :returns: status and response data
 
         action_url = "%s/%s" % (self.api_url, action_url)
-        try:
-            c = HTTPSClientAuthConnection(self.host, self.port,
-                                          key_file=self.key_file,
-                                          cert_file=self.cert_file,
-                                          ca_file=self.ca_file)
-            c.request(method, action_url, body, headers)
-            res = c.getresponse()
-            status_code = res.status
-            if status_code in (httplib.OK,
-                               httplib.CREATED,
-                               httplib.ACCEPTED,
-                               httplib.NO_CONTENT):
-                return httplib.OK, res
-            return status_code, None
-
-        except (socket.error, IOError) as e:
-            return IOError, None
+        with self.connection_pool.item() as c:
+            # NOTE: the server may have dropped an idle keep-alive
+            # connection, so a reused connection gets one more try once
+            # it has been reopened.
+            retry = c.sock is not None
+            while True:
+                try:
+                    c.request(method, action_url, body, headers)
+                    res = c.getresponse()
+                    # The whole response has to be read before the
+                    # connection can carry the next request.
+                    data = res.read()
+                    break
+                except (socket.error, IOError, httplib.HTTPException):
+                    c.close()
+                    if not retry:
+                        return IOError, None
+                    retry = False
+
+        status_code = res.status
+        if status_code in (httplib.OK,
+                           httplib.CREATED,
+                           httplib.ACCEPTED,
+                           httplib.NO_CONTENT):
+            return httplib.OK, data
+        return status_code, None
 
     def _request(self, cmd, subcmd, hosts):
         body = {}
@@ -172,24 +214,35 @@ class AttestationService(object):
         headers['Accept'] = 'application/json'
         if self.auth_blob:
             headers['x-auth-blob'] = self.auth_blob
-        status, res = self._do_request(cmd, subcmd, cooked, headers)
+        status, data = self._do_request(cmd, subcmd, cooked, headers)
         if status == httplib.OK:
-            data = res.read()
             return status, jsonutils.loads(data)
         else:
             return status, None
 
+    def _poll_hosts(self, hosts):
+        status, data = self._request("POST", "PollHosts", hosts)
+        if data is not None:
+            return data.get('hosts')
+
     def do_attestation(self, hosts):
         """Attests compute nodes through OAT service.
 
+        Hosts are attested in batches of request_count, with the batches
+        issued concurrently.
+
         :param hosts: hosts list to be attested
         :returns: dictionary for trust level and validate time
         """
         result = None
 
-        status, data = self._request("POST", "PollHosts", hosts)
-        if data != None:
-            result = data.get('hosts')
+        hosts = list(hosts)
+        batches = [hosts[i:i + self.request_count]
+                   for i in xrange(0, len(hosts), self.request_count)]
+        pool = eventlet.GreenPool(self.max_connections)
+        for states in pool.imap(self._poll_hosts, batches):
+            if states is not None:
+                result = (result or []) + states
 
         return result
 
@@ -203,11 +256,17 @@ class ComputeAttestationCache(object):
 
     OAT service may have cache also. OAT service's cache valid time
     should be set shorter than trusted filter's cache valid time.
+
+    With attestation_refresh_interval set the cache is instead refreshed
+    in the background and lookups never wait on the OAT service; a host
+    whose entry has expired is reported with an unknown trust level.
     """
 
     def __init__(self):
         self.attestservice = AttestationService()
         self.compute_nodes = {}
+        self.lock = semaphore.Semaphore()
+        self.refresh_timer = None
         admin = context.get_admin_context()
 
         # Fetch compute node list to initialize the compute_nodes,
@@ -222,6 +281,11 @@ class ComputeAttestationCache(object):
             host = service['host']
             self._init_cache_entry(host)
 
+        interval = CONF.trusted_computing.attestation_refresh_interval
+        if interval > 0:
+            self.refresh_timer = utils.FixedIntervalLoopingCall(self.refresh)
+            self.refresh_timer.start(interval=interval)
+
     def _cache_valid(self, host):
         cachevalid = False
         if host in self.compute_nodes:
@@ -267,12 +331,27 @@ class ComputeAttestationCache(object):
         for state in states:
             self._update_cache_entry(state)
 
+    def refresh(self):
+        """Re-attest every known host."""
+        with self.lock:
+            self._update_cache()
+
+    def stop(self):
+        if self.refresh_timer is not None:
+            self.refresh_timer.stop()
+            self.refresh_timer = None
+
     def get_host_attestation(self, host):
         """Check host's trust level."""
         if host not in self.compute_nodes:
             self._init_cache_entry(host)
         if not self._cache_valid(host):
-            self._update_cache()
+            if self.refresh_timer is not None:
+                return 'unknown'
+            with self.lock:
+                # Another request may have refreshed the cache meanwhile.
+                if not self._cache_valid(host):
+                    self._update_cache()
         level = self.compute_nodes.get(host).get('trust_lvl')
         return level
 
@@ -289,8 +368,14 @@ class ComputeAttestation(object):
 class TrustedFilter(filters.BaseHostFilter):
     """Trusted filter to support Trusted Compute Pools."""
 
+    # NOTE: filters are instantiated for every scheduling request, so the
+    # attestation cache and its connections are shared between instances.
+    _compute_attestation = None
+
     def __init__(self):
-        self.compute_attestation = ComputeAttestation()
+        if TrustedFilter._compute_attestation is None:
+            TrustedFilter._compute_attestation = ComputeAttestation()
+        self.compute_attestation = TrustedFilter._compute_attestation
 
     def host_passes(self, host_state, filter_properties):
         instance = filter_properties.get('instance_type', {})
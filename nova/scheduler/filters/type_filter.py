@@ -16,6 +16,7 @@
 
 from nova import db
 from nova.scheduler import filters
+from nova.scheduler.filters import utils
 
 
 class TypeAffinityFilter(filters.BaseHostFilter):
@@ -48,8 +49,8 @@ class AggregateTypeAffinityFilter(filters.BaseHostFilter):
 
     def host_passes(self, host_state, filter_properties):
         instance_type = filter_properties.get('instance_type')
-        context = filter_properties['context'].elevated()
-        metadata = db.aggregate_metadata_get_by_host(
-                     context, host_state.host, key='instance_type')
+        context = filter_properties['context']
+        metadata = utils.aggregate_metadata_get_by_host(
+                     context, host_state, key='instance_type')
         return (len(metadata) == 0 or
                 instance_type['name'] in metadata['instance_type'])
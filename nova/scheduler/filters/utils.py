@@ -0,0 +1,37 @@
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Utility methods for scheduler filters."""
+
+from nova import db
+
+
+def aggregate_metadata_get_by_host(context, host_state, key=None):
+    """Returns the metadata of the aggregates the host belongs to, as a
+    dict of sets.
+
+    The metadata loaded by the HostManager for the current scheduling pass
+    is used when available, otherwise it is looked up in the db.  If key is
+    given, only that key is returned.
+    """
+    metadata = host_state.aggregates_metadata
+    if metadata is None:
+        return db.aggregate_metadata_get_by_host(context.elevated(),
+                                                 host_state.host, key=key)
+    if key is None:
+        return metadata
+    if key in metadata:
+        return {key: metadata[key]}
+    return {}
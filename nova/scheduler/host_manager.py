@@ -17,6 +17,8 @@
 Manage hosts in the current zone.
 """
 
+import operator
+import time
 import UserDict
 
 from oslo.config import cfg
@@ -51,6 +53,25 @@ host_manager_opts = [
     cfg.ListOpt('scheduler_weight_classes',
                 default=['nova.scheduler.weights.all_weighers'],
                 help='Which weight class names to use for weighing hosts'),
+    cfg.IntOpt('scheduler_host_state_refresh_interval',
+               default=0,
+               help='Number of seconds between full reloads of all compute '
+                    'nodes into the scheduler host states.  In between, '
+                    'only compute nodes updated since the last request '
+                    'are read, and deleted compute nodes are only dropped '
+                    'on a full reload.  0 reloads all compute nodes on '
+                    'every request.'),
+    cfg.BoolOpt('scheduler_adaptive_filter_order',
+                default=False,
+                help='Measure the cost and rejection rate of every filter, '
+                     'and run the filters that are cheapest for each host '
+                     'they reject first, instead of in the order they are '
+                     'given in.'),
+    cfg.ListOpt('scheduler_pinned_filters',
+                default=[],
+                help='Filter class names that keep their position when the '
+                     'filters are reordered by '
+                     'scheduler_adaptive_filter_order.'),
     ]
 
 CONF = cfg.CONF
@@ -127,6 +148,11 @@ class HostState(object):
         # Resource oversubscription values for the compute host:
         self.limits = {}
 
+        # Metadata of the aggregates this host belongs to, as
+        # {key: set(values)}.  Set by the HostManager on every scheduling
+        # pass; None means it has not been loaded.
+        self.aggregates_metadata = None
+
         self.updated = None
 
     def update_capabilities(self, capabilities=None, service=None):
@@ -168,31 +194,23 @@ class HostState(object):
         # Track number of instances on host
         self.num_instances = int(statmap.get('num_instances', 0))
 
-        # Track number of instances by project_id
-        project_id_keys = [k for k in statmap.keys() if
-                k.startswith("num_proj_")]
-        for key in project_id_keys:
-            project_id = key[9:]
-            self.num_instances_by_project[project_id] = int(statmap[key])
-
-        # Track number of instances in certain vm_states
-        vm_state_keys = [k for k in statmap.keys() if k.startswith("num_vm_")]
-        for key in vm_state_keys:
-            vm_state = key[7:]
-            self.vm_states[vm_state] = int(statmap[key])
-
-        # Track number of instances in certain task_states
-        task_state_keys = [k for k in statmap.keys() if
-                k.startswith("num_task_")]
-        for key in task_state_keys:
-            task_state = key[9:]
-            self.task_states[task_state] = int(statmap[key])
-
-        # Track number of instances by host_type
-        os_keys = [k for k in statmap.keys() if k.startswith("num_os_type_")]
-        for key in os_keys:
-            os = key[12:]
-            self.num_instances_by_os_type[os] = int(statmap[key])
+        for key, value in statmap.iteritems():
+            if key.startswith("num_proj_"):
+                # Track number of instances by project_id
+                project_id = key[9:]
+                self.num_instances_by_project[project_id] = int(value)
+            elif key.startswith("num_vm_"):
+                # Track number of instances in certain vm_states
+                vm_state = key[7:]
+                self.vm_states[vm_state] = int(value)
+            elif key.startswith("num_task_"):
+                # Track number of instances in certain task_states
+                task_state = key[9:]
+                self.task_states[task_state] = int(value)
+            elif key.startswith("num_os_type_"):
+                # Track number of instances by host_type
+                os = key[12:]
+                self.num_instances_by_os_type[os] = int(value)
 
         self.num_io_ops = int(statmap.get('io_workload', 0))
 
@@ -260,6 +278,9 @@ class HostManager(object):
         # { (host, hypervisor_hostname) : { <service> : { cap k : v }}}
         self.service_states = {}
         self.host_state_map = {}
+        # Start times of the last full and partial compute node reloads
+        self.last_full_refresh = None
+        self.last_refresh = None
         self.filter_handler = filters.HostFilterHandler()
         self.filter_classes = self.filter_handler.get_matching_classes(
                 CONF.scheduler_available_filters)
@@ -338,13 +359,47 @@ class HostManager(object):
                     return name_to_cls_map.values()
             hosts = name_to_cls_map.itervalues()
 
-        return self.filter_handler.get_filtered_objects(filter_classes,
-                hosts, filter_properties)
+        adaptive = CONF.scheduler_adaptive_filter_order
+        if adaptive:
+            filter_classes = self.filter_handler.order_filters(
+                    filter_classes, CONF.scheduler_pinned_filters)
+        stats = filter_properties.get('scheduler_stats')
+        if stats is None and not adaptive:
+            return self.filter_handler.get_filtered_objects(filter_classes,
+                    hosts, filter_properties)
+
+        # Run the filters one at a time instead of chaining them, so that
+        # each one can be timed on its own.
+        hosts = list(hosts)
+        for filter_cls in filter_classes:
+            num_hosts = len(hosts)
+            start = time.time()
+            hosts = list(filter_cls().filter_all(hosts, filter_properties))
+            elapsed = time.time() - start
+            if stats is not None:
+                stats.add_filter(filter_cls.__name__, elapsed, num_hosts,
+                                 len(hosts))
+            if adaptive:
+                self.filter_handler.record_filter_run(filter_cls, elapsed,
+                                                      num_hosts, len(hosts))
+        return hosts
 
     def get_weighed_hosts(self, hosts, weight_properties):
         """Weigh the hosts."""
-        return self.weight_handler.get_weighed_objects(self.weight_classes,
-                hosts, weight_properties)
+        stats = weight_properties.get('scheduler_stats')
+        if stats is None or not hosts:
+            return self.weight_handler.get_weighed_objects(
+                    self.weight_classes, hosts, weight_properties)
+
+        weighed_hosts = [self.weight_handler.object_class(host, 0.0)
+                         for host in hosts]
+        for weigher_cls in self.weight_classes:
+            start = time.time()
+            weigher_cls().weigh_objects(weighed_hosts, weight_properties)
+            stats.add_weigher(weigher_cls.__name__, time.time() - start,
+                              len(weighed_hosts))
+        return sorted(weighed_hosts, key=operator.attrgetter('weight'),
+                      reverse=True)
 
     def update_service_capabilities(self, service_name, host, capabilities):
         """Update the per-service capabilities based on this notification."""
@@ -362,14 +417,60 @@ class HostManager(object):
         capab_copy["timestamp"] = timeutils.utcnow()  # Reported time
         self.service_states[state_key] = capab_copy
 
-    def get_all_host_states(self, context):
+        # Host states are not rebuilt for unchanged compute nodes, so
+        # apply the new capabilities right away.
+        host_state = self.host_state_map.get(state_key)
+        if host_state:
+            host_state.update_capabilities(capab_copy, host_state.service)
+
+    def _get_aggregates_metadata(self, context):
+        """Returns a dict mapping each host to the metadata of all the
+        aggregates it belongs to, in the same {key: set(values)} form as
+        db.aggregate_metadata_get_by_host().
+        """
+        aggregates_metadata = {}
+        for aggregate in db.aggregate_get_all(context):
+            metadata = aggregate['metadetails']
+            for host in aggregate['hosts']:
+                host_metadata = aggregates_metadata.setdefault(host, {})
+                for key, value in metadata.iteritems():
+                    host_metadata.setdefault(key, set()).add(value)
+        return aggregates_metadata
+
+    def _get_compute_nodes(self, context):
+        """Returns the compute nodes to update the host states from, and
+        whether they are all the compute nodes or only the ones updated
+        since the last call.
+        """
+        now = timeutils.utcnow()
+        interval = CONF.scheduler_host_state_refresh_interval
+        full_refresh = (interval <= 0 or self.last_full_refresh is None or
+                timeutils.is_older_than(self.last_full_refresh, interval))
+        if full_refresh:
+            compute_nodes = db.compute_node_get_all(context)
+            self.last_full_refresh = now
+        else:
+            compute_nodes = db.compute_node_get_all(context,
+                    updated_since=self.last_refresh)
+        self.last_refresh = now
+        return compute_nodes, full_refresh
+
+    def get_all_host_states(self, context, stats=None):
         """Returns a list of HostStates that represents all the hosts
         the HostManager knows about. Also, each of the consumable resources
         in HostState are pre-populated and adjusted based on data in the db.
+
+        :param stats: optional SchedulerStats to add the database time to
         """
 
+        start = time.time()
         # Get resource usage across the available compute nodes:
-        compute_nodes = db.compute_node_get_all(context)
+        compute_nodes, full_refresh = self._get_compute_nodes(context)
+        # Load aggregate metadata for all hosts at once, so the aggregate
+        # filters do not have to query it for every host.
+        aggregates_metadata = self._get_aggregates_metadata(context)
+        if stats is not None:
+            stats.add_db_time(time.time() - start)
         seen_nodes = set()
         for compute in compute_nodes:
             service = compute['service']
@@ -392,6 +493,12 @@ class HostManager(object):
             host_state.update_from_compute_node(compute)
             seen_nodes.add(state_key)
 
+        for (host, node), host_state in self.host_state_map.iteritems():
+            host_state.aggregates_metadata = aggregates_metadata.get(host, {})
+
+        if not full_refresh:
+            return self.host_state_map.itervalues()
+
         # remove compute nodes from host_state_map if they are not active
         dead_nodes = set(self.host_state_map.keys()) - seen_nodes
         for state_key in dead_nodes:
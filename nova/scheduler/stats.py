@@ -0,0 +1,98 @@
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+SchedulerStats collects where the time goes while scheduling one request:
+the database time spent loading the host states, and the wall time and
+number of hosts passed and rejected for every filter and weigher.
+"""
+
+from oslo.config import cfg
+
+from nova.openstack.common import jsonutils
+from nova.openstack.common import log as logging
+from nova.openstack.common.notifier import api as notifier
+
+scheduler_stats_opts = [
+    cfg.BoolOpt('scheduler_collect_stats',
+                default=False,
+                help='Time every filter and weigher, count the hosts they '
+                     'pass and reject, and time the database queries for '
+                     'the host states.  The totals for each request are '
+                     'sent out in a scheduler.stats notification.'),
+    cfg.StrOpt('scheduler_stats_file',
+               default=None,
+               help='File to also append the scheduler stats of each '
+                    'request to, as one JSON document per line.  Only used '
+                    'with scheduler_collect_stats.'),
+    ]
+
+CONF = cfg.CONF
+CONF.register_opts(scheduler_stats_opts)
+
+LOG = logging.getLogger(__name__)
+
+
+class SchedulerStats(object):
+    """Timings and host counters for a single scheduling request.
+
+    Filters and weighers run once for every instance in the request, so
+    their timings and counters add up over all the runs.
+    """
+
+    def __init__(self):
+        self.db_time = 0.0
+        self.filters = {}
+        self.weighers = {}
+
+    def add_db_time(self, elapsed):
+        self.db_time += elapsed
+
+    def add_filter(self, name, elapsed, hosts_in, hosts_out):
+        stats = self.filters.setdefault(name, {'runs': 0, 'time': 0.0,
+                                               'passed': 0, 'rejected': 0})
+        stats['runs'] += 1
+        stats['time'] += elapsed
+        stats['passed'] += hosts_out
+        stats['rejected'] += hosts_in - hosts_out
+
+    def add_weigher(self, name, elapsed, hosts):
+        stats = self.weighers.setdefault(name, {'runs': 0, 'time': 0.0,
+                                                'hosts': 0})
+        stats['runs'] += 1
+        stats['time'] += elapsed
+        stats['hosts'] += hosts
+
+    def to_dict(self):
+        return {'db_time': self.db_time,
+                'filters': self.filters,
+                'weighers': self.weighers}
+
+    def report(self, context, instance_uuids=None):
+        """Send the stats out in a notification, and append them to
+        scheduler_stats_file if it is set.
+        """
+        payload = dict(self.to_dict(), instance_uuids=instance_uuids)
+        LOG.debug(_("Scheduler stats: %s") % payload)
+        notifier.notify(context, notifier.publisher_id("scheduler"),
+                        'scheduler.stats', notifier.INFO, payload)
+        if not CONF.scheduler_stats_file:
+            return
+        try:
+            with open(CONF.scheduler_stats_file, 'a') as stats_file:
+                stats_file.write(jsonutils.dumps(payload) + '\n')
+        except IOError as e:
+            LOG.warn(_("Could not write scheduler stats to %(file)s: "
+                       "%(e)s"), {'file': CONF.scheduler_stats_file, 'e': e})
@@ -3627,6 +3627,47 @@ class ComputeTestCase(BaseTestCase):
         for instance in unrescued_instances.values():
             self.assertTrue(instance)
 
+    def test_poll_bandwidth_usage(self):
+        ctxt = context.get_admin_context()
+        start_time = timeutils.utcnow().replace(microsecond=0)
+        prev_time = start_time - datetime.timedelta(hours=1)
+        db.bw_usage_update(ctxt, 'fake_uuid1', 'fake_mac1', start_time,
+                           100, 200, 1000, 2000)
+        db.bw_usage_update(ctxt, 'fake_uuid2', 'fake_mac2', prev_time,
+                           10, 20, 300, 400)
+
+        bw_counters = [{'uuid': 'fake_uuid1', 'mac_address': 'fake_mac1',
+                        'bw_in': 1500, 'bw_out': 50},
+                       {'uuid': 'fake_uuid2', 'mac_address': 'fake_mac2',
+                        'bw_in': 350, 'bw_out': 450},
+                       {'uuid': 'fake_uuid3', 'mac_address': 'fake_mac3',
+                        'bw_in': 5, 'bw_out': 6}]
+
+        self.stubs.Set(self.compute.conductor_api, 'instance_get_all_by_host',
+                       lambda context, host: [])
+        self.stubs.Set(self.compute.driver, 'get_all_bw_counters',
+                       lambda instances: bw_counters)
+        self.stubs.Set(utils, 'last_completed_audit_period',
+                       lambda: (prev_time, start_time))
+        self.stubs.Set(self.compute.conductor_api, 'bw_usage_get',
+                       lambda *args: self.fail('per-counter lookup'))
+        self.flags(bandwidth_poll_interval=1)
+        self.compute._last_bw_usage_poll = 0
+
+        self.compute._poll_bandwidth_usage(ctxt)
+
+        usages = db.bw_usage_get_by_uuids(ctxt,
+                ['fake_uuid1', 'fake_uuid2', 'fake_uuid3'], start_time)
+        usages = dict((usage['uuid'], usage) for usage in usages)
+        self.assertEqual((usages['fake_uuid1']['bw_in'],
+                          usages['fake_uuid1']['bw_out']), (600, 250))
+        self.assertEqual((usages['fake_uuid2']['bw_in'],
+                          usages['fake_uuid2']['bw_out']), (50, 50))
+        self.assertEqual((usages['fake_uuid3']['bw_in'],
+                          usages['fake_uuid3']['bw_out']), (0, 0))
+        self.assertEqual(usages['fake_uuid1']['last_ctr_in'], 1500)
+        self.assertEqual(usages['fake_uuid3']['last_ctr_out'], 6)
+
     def test_poll_unconfirmed_resizes(self):
         instances = [{'uuid': 'fake_uuid1', 'vm_state': vm_states.RESIZED,
                       'task_state': None},
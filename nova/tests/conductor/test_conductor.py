@@ -266,6 +266,24 @@ class _BaseTestCase(object):
         result = self.conductor.bw_usage_update(*update_args)
         self.assertEqual(result, 'foo')
 
+    def test_bw_usage_get_by_uuids_and_periods(self):
+        self.mox.StubOutWithMock(db, 'bw_usage_get_by_uuids_and_periods')
+        db.bw_usage_get_by_uuids_and_periods(self.context, ['uuid'],
+                                             [0, 1]).AndReturn(['foo'])
+        self.mox.ReplayAll()
+        result = self.conductor.bw_usage_get_by_uuids_and_periods(
+            self.context, ['uuid'], [0, 1])
+        self.assertEqual(result, ['foo'])
+
+    def test_bw_usage_update_all(self):
+        self.mox.StubOutWithMock(db, 'bw_usage_update_all')
+        usages = [dict(uuid='uuid', mac='mac', bw_in=10, bw_out=20,
+                       last_ctr_in=5, last_ctr_out=10)]
+        db.bw_usage_update_all(self.context, 0, usages, 20)
+        self.mox.ReplayAll()
+        self.conductor.bw_usage_update_all(self.context, 0, usages,
+                                           last_refreshed=20)
+
     def test_get_backdoor_port(self):
         backdoor_port = 59697
 
@@ -149,6 +149,19 @@ class FakeNetworkManager(network_manager.NetworkManager):
             return [ip for ip in self.fixed_ips
                     if ip['virtual_interface_id'] == vif_id]
 
+        def fixed_ip_get_by_address_filter(self, context, address=None,
+                                           address_like=None):
+            fixed_ips = []
+            for vif in self.vifs:
+                for fixed_ip in self.fixed_ips_by_virtual_interface(context,
+                                                                   vif['id']):
+                    floating_ips = [ip['address'] for ip in self.floating_ips
+                                    if ip['fixed_ip_id'] == fixed_ip['id']]
+                    fixed_ips.append({'address': fixed_ip['address'],
+                                      'instance_uuid': vif['instance_uuid'],
+                                      'floating_ips': floating_ips})
+            return fixed_ips
+
         def fixed_ip_disassociate(self, context, address):
             return True
 
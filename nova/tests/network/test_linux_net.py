@@ -18,6 +18,7 @@
 import calendar
 import os
 
+from eventlet import greenthread
 import mox
 from oslo.config import cfg
 
@@ -241,6 +242,8 @@ class LinuxNetworkTestCase(test.TestCase):
         self.stubs.Set(db, 'virtual_interface_get_by_instance', get_vifs)
         self.stubs.Set(db, 'instance_get', get_instance)
         self.stubs.Set(db, 'network_get_associated_fixed_ips', get_associated)
+        self.stubs.Set(linux_net, '_dhcp_fixed_ips', {})
+        self.stubs.Set(linux_net, '_dhcp_updates_pending', set())
 
     def test_update_dhcp_for_nw00(self):
         self.flags(use_single_default_gateway=True)
@@ -288,6 +291,71 @@ class LinuxNetworkTestCase(test.TestCase):
 
         self.driver.update_dhcp(self.context, "eth0", networks[0])
 
+    def _stub_dhcp_hostfile(self):
+        written = []
+        restarted = []
+        self.stubs.Set(linux_net, '_dhcp_file',
+                       lambda dev, kind: '/fake/nova-%s.%s' % (dev, kind))
+        self.stubs.Set(linux_net, 'write_to_file',
+                       lambda path, data: written.append(data))
+        self.stubs.Set(linux_net, 'restart_dhcp',
+                       lambda context, dev, network_ref: restarted.append(dev))
+        return written, restarted
+
+    def test_update_dhcp_host_coalesces_changes(self):
+        written, restarted = self._stub_dhcp_hostfile()
+        self.driver.update_dhcp(self.context, "eth0", networks[0])
+
+        released = ['192.168.0.100']
+        lookups = []
+
+        def fake_get_associated(context, network_id, host=None, address=None):
+            lookups.append(address)
+            return [data for data in get_associated(context, network_id,
+                                                    host, address)
+                    if data['address'] not in released]
+
+        delayed = []
+
+        def fake_spawn_after(seconds, func, *args):
+            delayed.append((func, args))
+
+        self.stubs.Set(db, 'network_get_associated_fixed_ips',
+                       fake_get_associated)
+        self.stubs.Set(greenthread, 'spawn_after', fake_spawn_after)
+
+        self.driver.update_dhcp_host(self.context, "eth0", networks[0],
+                                     '192.168.0.100')
+        self.driver.update_dhcp_host(self.context, "eth0", networks[0],
+                                     '192.168.0.102')
+        self.assertEqual(['192.168.0.100', '192.168.0.102'], lookups)
+        self.assertEqual(1, len(written))
+        self.assertEqual(1, len(delayed))
+
+        func, args = delayed[0]
+        func(*args)
+        self.assertEqual("DE:AD:BE:EF:00:03,fake_instance01.novalocal,"
+                         "192.168.1.101\n"
+                         "DE:AD:BE:EF:00:04,fake_instance00.novalocal,"
+                         "192.168.0.102", written[-1])
+        self.assertEqual(['eth0', 'eth0'], restarted)
+
+    def test_update_dhcp_host_updates_all_hosts_first(self):
+        self.flags(dnsmasq_reload_delay=0)
+        written, restarted = self._stub_dhcp_hostfile()
+
+        self.driver.update_dhcp_host(self.context, "eth0", networks[0],
+                                     '192.168.0.100')
+        self.assertEqual([self.driver.get_dhcp_hosts(self.context,
+                                                     networks[0])],
+                         written)
+        self.assertEqual(['eth0'], restarted)
+
+        self.driver.update_dhcp_host(self.context, "eth0", networks[0],
+                                     '192.168.0.100')
+        self.assertEqual(2, len(written))
+        self.assertEqual(['eth0', 'eth0'], restarted)
+
     def test_get_dhcp_hosts_for_nw00(self):
         self.flags(use_single_default_gateway=True)
 
@@ -627,10 +695,7 @@ class LinuxNetworkTestCase(test.TestCase):
              iface, '--arp-ip-dst', dhcp, '-j', 'DROP'),
             ('ebtables', '-t', 'filter', '-D', 'OUTPUT', '-p', 'ARP', '-o',
              iface, '--arp-ip-src', dhcp, '-j', 'DROP'),
-            ('iptables-save', '-c'),
-            ('iptables-restore', '-c'),
-            ('ip6tables-save', '-c'),
-            ('ip6tables-restore', '-c'),
+            ('iptables-restore', '-c', '--noflush'),
         ]
         self.assertEqual(executes, expected)
         for inp in expected_inputs:
@@ -718,10 +783,7 @@ class LinuxNetworkTestCase(test.TestCase):
              iface, '--arp-ip-dst', dhcp, '-j', 'DROP'),
             ('ebtables', '-t', 'filter', '-D', 'OUTPUT', '-p', 'ARP', '-o',
              iface, '--arp-ip-src', dhcp, '-j', 'DROP'),
-            ('iptables-save', '-c'),
-            ('iptables-restore', '-c'),
-            ('ip6tables-save', '-c'),
-            ('ip6tables-restore', '-c'),
+            ('iptables-restore', '-c', '--noflush'),
         ]
         self.assertEqual(executes, expected)
         for inp in expected_inputs:
@@ -1121,7 +1121,7 @@ class VlanNetworkTestCase(test.TestCase):
         def network_get(_context, network_id, project_only="allow_none"):
             return networks[network_id]
 
-        def teardown_network_on_host(_context, network):
+        def teardown_network_on_host(_context, network, **kwargs):
             if network['id'] == 0:
                 raise test.TestingException()
 
@@ -1573,6 +1573,66 @@ class CommonNetworkTestCase(test.TestCase):
         self.assertEqual(len(res), 1)
         self.assertEqual(res[0]['instance_uuid'], _vifs[2]['instance_uuid'])
 
+    def test_get_instance_uuids_by_floating_ip_regex(self):
+        manager = fake_network.FakeNetworkManager()
+        _vifs = manager.db.virtual_interface_get_all(None)
+        fake_context = context.RequestContext('user', 'project')
+
+        res = manager.get_instance_uuids_by_ip_filter(fake_context,
+                                                      {'ip': '173.16.1.2'})
+        self.assertEqual(res, [{'instance_uuid': _vifs[2]['instance_uuid'],
+                                'ip': '173.16.1.2'}])
+
+    def test_get_instance_uuids_by_ip_filter_queries_db_once(self):
+        manager = fake_network.FakeNetworkManager()
+        fake_context = context.RequestContext('user', 'project')
+        self.mox.StubOutWithMock(manager.db, 'fixed_ip_get_by_address_filter')
+        manager.db.fixed_ip_get_by_address_filter(fake_context,
+                address='10.0.0.1', address_like=None).AndReturn([])
+        manager.db.fixed_ip_get_by_address_filter(fake_context,
+                address='10.0.0.1', address_like='10_1_%').AndReturn([])
+        manager.db.fixed_ip_get_by_address_filter(fake_context,
+                address=None, address_like=None).AndReturn([])
+        self.mox.ReplayAll()
+
+        manager.get_instance_uuids_by_ip_filter(fake_context,
+                                                {'fixed_ip': '10.0.0.1'})
+        manager.get_instance_uuids_by_ip_filter(fake_context,
+                                                {'fixed_ip': '10.0.0.1',
+                                                 'ip': '10.1.'})
+        manager.get_instance_uuids_by_ip_filter(fake_context,
+                                                {'fixed_ip': '10.0.0.1',
+                                                 'ip': '10.(1|2)'})
+
+    def test_get_instance_uuids_by_ipv6_looks_up_networks_once(self):
+        manager = fake_network.FakeNetworkManager()
+        fake_context = context.RequestContext('user', 'project')
+        vifs = [dict(vif, network_id=1)
+                for vif in manager.db.virtual_interface_get_all(None)]
+        self.stubs.Set(manager.db, 'virtual_interface_get_all',
+                       lambda context: vifs)
+        self.mox.StubOutWithMock(manager, '_get_network_by_id')
+        manager._get_network_by_id(fake_context, 1).AndReturn(
+            {'cidr_v6': '2001:db8:69:1::/64'})
+        self.mox.ReplayAll()
+
+        res = manager.get_instance_uuids_by_ip_filter(fake_context,
+                                                      {'ip6': '2001:'})
+        self.assertEqual(len(res), len(vifs))
+
+    def test_ip_filter_to_like(self):
+        self.assertEqual(network_manager._ip_filter_to_like('10.1.'),
+                         '10_1_%')
+        self.assertEqual(network_manager._ip_filter_to_like('172.16.0.*'),
+                         '172_16_0%')
+        self.assertEqual(network_manager._ip_filter_to_like('fe80::1'),
+                         'fe80::1%')
+        self.assertEqual(network_manager._ip_filter_to_like(''), '%')
+        self.assertEqual(network_manager._ip_filter_to_like('10.(1|2)'),
+                         None)
+        self.assertEqual(network_manager._ip_filter_to_like('10.1+'), None)
+        self.assertEqual(network_manager._ip_filter_to_like('10%'), None)
+
     def test_get_network(self):
         manager = fake_network.FakeNetworkManager()
         fake_context = context.RequestContext('user', 'project')
@@ -67,6 +67,13 @@ INSTANCES = [
              host='host5', node='node5'),
 ]
 
+AGGREGATES = [
+        dict(id=1, name='agg1', hosts=['host1', 'host2'],
+             metadetails={'availability_zone': 'az1'}),
+        dict(id=2, name='agg2', hosts=['host2'],
+             metadetails={'availability_zone': 'az2', 'ssd': 'true'}),
+]
+
 
 class FakeFilterScheduler(filter_scheduler.FilterScheduler):
     def __init__(self, *args, **kwargs):
@@ -16,6 +16,8 @@
 Tests For Filter Scheduler.
 """
 
+import os
+
 import mox
 
 from nova.compute import instance_types
@@ -26,6 +28,9 @@ from nova.conductor import api as conductor_api
 from nova import context
 from nova import db
 from nova import exception
+from nova.openstack.common import jsonutils
+from nova.openstack.common.notifier import api as notifier_api
+from nova.openstack.common.notifier import test_notifier
 from nova.openstack.common import rpc
 from nova.scheduler import driver
 from nova.scheduler import filter_scheduler
@@ -34,6 +39,7 @@ from nova.scheduler import weights
 from nova import servicegroup
 from nova.tests.scheduler import fakes
 from nova.tests.scheduler import test_scheduler
+from nova import utils
 
 
 def fake_get_filtered_hosts(hosts, filter_properties):
@@ -586,6 +592,38 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         # one host should be chosen
         self.assertEqual(len(hosts), 1)
 
+    def test_schedule_drops_stale_affinity_hosts(self):
+        """Affinity hint lookups cached by a previous attempt must not be
+        reused by a new scheduling pass."""
+
+        sched = fakes.FakeFilterScheduler()
+
+        fake_context = context.RequestContext('user', 'project',
+                is_admin=True)
+        seen = []
+
+        def _fake_get_filtered_hosts(hosts, filter_properties):
+            seen.append(filter_properties.get('affinity_hosts'))
+            return list(hosts)
+
+        self.stubs.Set(sched.host_manager, 'get_filtered_hosts',
+                _fake_get_filtered_hosts)
+        fakes.mox_host_manager_db_calls(self.mox, fake_context)
+
+        instance_properties = {'project_id': 1,
+                                    'root_gb': 512,
+                                    'memory_mb': 512,
+                                    'ephemeral_gb': 0,
+                                    'vcpus': 1,
+                                    'os_type': 'Linux'}
+        request_spec = dict(instance_properties=instance_properties)
+        filter_properties = {'affinity_hosts': {'same_host': ['host1']}}
+        self.mox.ReplayAll()
+        sched._schedule(self.context, request_spec,
+                filter_properties=filter_properties)
+
+        self.assertEqual([None], seen)
+
     def test_schedule_large_host_pool(self):
         """Hosts should still be chosen if pool size
         is larger than number of filtered hosts"""
@@ -658,6 +696,102 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
         self.assertEquals(50, hosts[0].weight)
 
+    def _schedule_with_ram_filter(self, num_instances):
+        self.flags(scheduler_default_filters=['RamFilter'],
+                   ram_allocation_ratio=1.0)
+        sched = fakes.FakeFilterScheduler()
+        fake_context = context.RequestContext('user', 'project',
+                is_admin=True)
+        fakes.mox_host_manager_db_calls(self.mox, fake_context)
+
+        request_spec = {'num_instances': num_instances,
+                        'instance_type': {'memory_mb': 500, 'root_gb': 1,
+                                          'ephemeral_gb': 0,
+                                          'vcpus': 1},
+                        'instance_properties': {'project_id': 1,
+                                                'root_gb': 1,
+                                                'memory_mb': 500,
+                                                'ephemeral_gb': 0,
+                                                'vcpus': 1,
+                                                'os_type': 'Linux'}}
+        self.mox.ReplayAll()
+        weighed_hosts = sched._schedule(fake_context, request_spec, {})
+        self.mox.VerifyAll()
+        self.mox.UnsetStubs()
+        return [weighed_host.obj.host for weighed_host in weighed_hosts]
+
+    def test_schedule_bulk_placement_matches_default(self):
+        # NOTE: 500MB instances never leave two hosts with the same free
+        # ram, so the order of the choices does not depend on ties.
+        expected = self._schedule_with_ram_filter(30)
+        self.flags(scheduler_bulk_placement=True)
+        hosts = self._schedule_with_ram_filter(30)
+        self.assertEqual(expected, hosts)
+        # all hosts fill up before all instances are placed
+        self.assertEqual(25, len(hosts))
+
+    def test_schedule_bulk_placement_only_refilters_chosen_host(self):
+        self.flags(scheduler_bulk_placement=True)
+        sched = fakes.FakeFilterScheduler()
+        fake_context = context.RequestContext('user', 'project',
+                is_admin=True)
+        filtered = []
+
+        def _fake_get_filtered_hosts(hosts, filter_properties):
+            hosts = list(hosts)
+            filtered.append([host.host for host in hosts])
+            return hosts
+
+        self.stubs.Set(sched.host_manager, 'get_filtered_hosts',
+                _fake_get_filtered_hosts)
+        fakes.mox_host_manager_db_calls(self.mox, fake_context)
+
+        request_spec = {'num_instances': 3,
+                        'instance_type': {'memory_mb': 512, 'root_gb': 512,
+                                          'ephemeral_gb': 0,
+                                          'vcpus': 1},
+                        'instance_properties': {'project_id': 1,
+                                                'root_gb': 512,
+                                                'memory_mb': 512,
+                                                'ephemeral_gb': 0,
+                                                'vcpus': 1,
+                                                'os_type': 'Linux'}}
+        self.mox.ReplayAll()
+        weighed_hosts = sched._schedule(fake_context, request_spec, {})
+
+        self.assertEqual(3, len(weighed_hosts))
+        self.assertEqual(4, len(filtered))
+        self.assertEqual(4, len(filtered[0]))
+        self.assertEqual([['host4']] * 3, filtered[1:])
+
+    def test_schedule_collects_stats(self):
+        with utils.tempdir() as tmpdir:
+            stats_file = os.path.join(tmpdir, 'stats')
+            self.flags(scheduler_collect_stats=True,
+                       scheduler_stats_file=stats_file,
+                       notification_driver=[test_notifier.__name__])
+            notifier_api._reset_drivers()
+            self.addCleanup(notifier_api._reset_drivers)
+            test_notifier.NOTIFICATIONS = []
+            hosts = self._schedule_with_ram_filter(3)
+            with open(stats_file) as f:
+                lines = f.readlines()
+
+        self.assertEqual(3, len(hosts))
+        self.assertEqual(1, len(test_notifier.NOTIFICATIONS))
+        msg = test_notifier.NOTIFICATIONS[0]
+        self.assertEqual('scheduler.stats', msg['event_type'])
+        payload = msg['payload']
+        self.assertEqual(['RamFilter'], payload['filters'].keys())
+        ram_filter = payload['filters']['RamFilter']
+        self.assertEqual(3, ram_filter['runs'])
+        # the 4 hosts are filtered once for every instance
+        self.assertEqual(12, ram_filter['passed'] + ram_filter['rejected'])
+        self.assertEqual(3, payload['weighers']['RAMWeigher']['runs'])
+        self.assertTrue(payload['db_time'] >= 0)
+        self.assertEqual([payload], [jsonutils.loads(line)
+                                     for line in lines])
+
     def test_select_hosts_happy_day(self):
         """select_hosts is basically a wrapper around the _select() method.
         Similar to the _select tests, this just does a happy path test to
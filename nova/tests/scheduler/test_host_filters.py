@@ -16,6 +16,8 @@ Tests For Scheduler Host Filters.
 """
 
 import httplib
+import os.path
+import socket
 
 from oslo.config import cfg
 import stubout
@@ -30,10 +32,16 @@ from nova.scheduler.filters import trusted_filter
 from nova import servicegroup
 from nova import test
 from nova.tests.scheduler import fakes
+from nova import utils
+from nova import wsgi
 
 CONF = cfg.CONF
 CONF.import_opt('my_ip', 'nova.netconf')
 
+SSL_CERT_DIR = os.path.normpath(os.path.join(
+                                os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'ssl_cert'))
+
 
 class TestFilter(filters.BaseHostFilter):
     pass
@@ -245,6 +253,8 @@ class HostFiltersTestCase(test.TestCase):
         self.stubs = stubout.StubOutForTesting()
         self.stubs.Set(trusted_filter.AttestationService, '_request',
                 self.fake_oat_request)
+        # The attestation cache is shared between TrustedFilter instances.
+        trusted_filter.TrustedFilter._compute_attestation = None
         self.context = context.RequestContext('fake', 'fake')
         self.json_query = jsonutils.dumps(
                 ['and', ['>=', '$free_ram_mb', 1024],
@@ -417,6 +427,52 @@ class HostFiltersTestCase(test.TestCase):
 
         self.assertFalse(filt_cls.host_passes(host, filter_properties))
 
+    def _test_affinity_filter_lookups(self, filter_name, hint, num_hosts):
+        filt_cls = self.class_map[filter_name]()
+        instance = fakes.FakeInstance(context=self.context,
+                                         params={'host': 'host1'})
+        calls = []
+        real_get_all = filt_cls.compute_api.get_all
+
+        def fake_get_all(*args, **kwargs):
+            calls.append(args)
+            return real_get_all(*args, **kwargs)
+
+        self.stubs.Set(filt_cls.compute_api, 'get_all', fake_get_all)
+
+        hosts = [fakes.FakeHostState('host%d' % i, 'node%d' % i, {})
+                 for i in xrange(num_hosts)]
+        filter_properties = {'context': self.context.elevated(),
+                             'scheduler_hints': {hint: [instance.uuid]}}
+        passed = list(filt_cls.filter_all(hosts, filter_properties))
+        return passed, calls
+
+    def test_affinity_different_filter_single_lookup(self):
+        for num_hosts in (10, 200):
+            passed, calls = self._test_affinity_filter_lookups(
+                    'DifferentHostFilter', 'different_host', num_hosts)
+            self.assertEqual(len(calls), 1)
+            self.assertEqual(len(passed), num_hosts - 1)
+            self.assertNotIn('host1', [host.host for host in passed])
+
+    def test_affinity_same_filter_single_lookup(self):
+        for num_hosts in (10, 200):
+            passed, calls = self._test_affinity_filter_lookups(
+                    'SameHostFilter', 'same_host', num_hosts)
+            self.assertEqual(len(calls), 1)
+            self.assertEqual(['host1'], [host.host for host in passed])
+
+    def test_affinity_filter_host_is_not_a_prefix_match(self):
+        filt_cls = self.class_map['DifferentHostFilter']()
+        host = fakes.FakeHostState('host1', 'node1', {})
+        instance = fakes.FakeInstance(context=self.context,
+                                         params={'host': 'host10'})
+        filter_properties = {'context': self.context.elevated(),
+                             'scheduler_hints': {
+                                'different_host': [instance.uuid], }}
+
+        self.assertTrue(filt_cls.host_passes(host, filter_properties))
+
     def test_affinity_simple_cidr_filter_passes(self):
         filt_cls = self.class_map['SimpleCIDRAffinityFilter']()
         host = fakes.FakeHostState('host1', 'node1', {})
@@ -518,6 +574,31 @@ class HostFiltersTestCase(test.TestCase):
         #False since type matches aggregate, metadata
         self.assertFalse(filt_cls.host_passes(host, filter2_properties))
 
+    def test_resource_filters_filter_all_matches_host_passes(self):
+        self._stub_service_is_up(True)
+        self.flags(ram_allocation_ratio=1.0, disk_allocation_ratio=1.0,
+                   cpu_allocation_ratio=1.0, max_instances_per_host=5,
+                   max_io_ops_per_host=2)
+        hosts = []
+        for i in xrange(8):
+            hosts.append(fakes.FakeHostState('host%d' % i, 'node%d' % i,
+                    {'free_ram_mb': 256 * i, 'total_usable_ram_mb': 2048,
+                     'free_disk_mb': 1024 * i, 'total_usable_disk_gb': 8,
+                     'vcpus_total': 4, 'vcpus_used': i % 5,
+                     'num_instances': i, 'num_io_ops': i % 4}))
+        filter_properties = {'instance_type': {'memory_mb': 1024,
+                                               'root_gb': 2,
+                                               'ephemeral_gb': 1,
+                                               'vcpus': 1}}
+        for name in ('RamFilter', 'CoreFilter', 'DiskFilter',
+                     'NumInstancesFilter', 'IoOpsFilter'):
+            filt_cls = self.class_map[name]()
+            expected = [host for host in hosts
+                        if filt_cls.host_passes(host, filter_properties)]
+            self.assertTrue(0 < len(expected) < len(hosts))
+            self.assertEqual(expected,
+                    list(filt_cls.filter_all(hosts, filter_properties)))
+
     def test_ram_filter_fails_on_memory(self):
         self._stub_service_is_up(True)
         filt_cls = self.class_map['RamFilter']()
@@ -1295,6 +1376,58 @@ class HostFiltersTestCase(test.TestCase):
 
         timeutils.clear_time_override()
 
+    def test_trusted_filter_shares_cache(self):
+        calls = []
+
+        def fake_compute_node_get_all(context):
+            calls.append(context)
+            return []
+
+        self.stubs.Set(db, 'compute_node_get_all', fake_compute_node_get_all)
+        filt1 = self.class_map['TrustedFilter']()
+        filt2 = self.class_map['TrustedFilter']()
+        self.assertTrue(filt1.compute_attestation is
+                        filt2.compute_attestation)
+        self.assertEqual(1, len(calls))
+
+    def test_trusted_filter_background_refresh(self):
+        self.oat_data = {"hosts": [{"host_name": "host1",
+                                    "trust_lvl": "trusted",
+                                    "vtime": timeutils.isotime()}]}
+        self.flags(attestation_refresh_interval=3600,
+                   group='trusted_computing')
+
+        class FakeLoopingCall(object):
+            def __init__(self, f):
+                self.f = f
+
+            def start(self, interval):
+                pass
+
+            def stop(self):
+                pass
+
+        # The refresh is run by hand below instead of in a green thread.
+        self.stubs.Set(utils, 'FixedIntervalLoopingCall', FakeLoopingCall)
+        filt_cls = self.class_map['TrustedFilter']()
+        caches = filt_cls.compute_attestation.caches
+        extra_specs = {'trust:trusted_host': 'trusted'}
+        filter_properties = {'context': self.context.elevated(),
+                             'instance_type': {'memory_mb': 1024,
+                                               'extra_specs': extra_specs}}
+        host = fakes.FakeHostState('host1', 'node1', {})
+
+        # Until the cache has been refreshed the host is not trusted, and
+        # the lookup does not wait on the attestation server.
+        self.assertFalse(filt_cls.host_passes(host, filter_properties))
+        self.assertFalse(self.oat_attested)
+
+        caches.refresh()
+        self.assertTrue(self.oat_attested)
+        self.oat_attested = False
+        self.assertTrue(filt_cls.host_passes(host, filter_properties))
+        self.assertFalse(self.oat_attested)
+
     def test_core_filter_passes(self):
         filt_cls = self.class_map['CoreFilter']()
         filter_properties = {'instance_type': {'vcpus': 1}}
@@ -1345,6 +1478,61 @@ class HostFiltersTestCase(test.TestCase):
                                    {'service': service})
         self.assertFalse(filt_cls.host_passes(host, request))
 
+    def _stub_aggregate_metadata_db(self):
+        def fake_aggregate_metadata_get_by_host(*args, **kwargs):
+            self.fail("aggregate metadata should come from the host state")
+
+        self.stubs.Set(db, 'aggregate_metadata_get_by_host',
+                       fake_aggregate_metadata_get_by_host)
+
+    def test_availability_zone_filter_uses_host_state_metadata(self):
+        self._stub_aggregate_metadata_db()
+        filt_cls = self.class_map['AvailabilityZoneFilter']()
+        host = fakes.FakeHostState('host1', 'node1',
+                {'aggregates_metadata': {'availability_zone': set(['az1'])}})
+        self.assertTrue(filt_cls.host_passes(host,
+                                             self._make_zone_request('az1')))
+        self.assertFalse(filt_cls.host_passes(host,
+                                              self._make_zone_request('az2')))
+
+    def test_aggregate_filters_use_host_state_metadata(self):
+        self._stub_aggregate_metadata_db()
+        metadata = {'opt1': set(['1']),
+                    'instance_type': set(['fake1']),
+                    'filter_tenant_id': set(['my_tenantid'])}
+        host = fakes.FakeHostState('host1', 'node1',
+                                   {'aggregates_metadata': metadata})
+        filter_properties = {'context': self.context,
+                             'instance_type': {'name': 'fake1',
+                                               'extra_specs': {'opt1': '1'}},
+                             'request_spec': {
+                                 'instance_properties': {
+                                     'project_id': 'my_tenantid'}}}
+        for name in ('AggregateInstanceExtraSpecsFilter',
+                     'AggregateTypeAffinityFilter',
+                     'AggregateMultiTenancyIsolation'):
+            filt_cls = self.class_map[name]()
+            self.assertTrue(filt_cls.host_passes(host, filter_properties))
+
+        filter_properties['instance_type'] = {'name': 'fake2',
+                                              'extra_specs': {'opt1': '2'}}
+        filter_properties['request_spec']['instance_properties'][
+                'project_id'] = 'other_tenantid'
+        for name in ('AggregateInstanceExtraSpecsFilter',
+                     'AggregateTypeAffinityFilter',
+                     'AggregateMultiTenancyIsolation'):
+            filt_cls = self.class_map[name]()
+            self.assertFalse(filt_cls.host_passes(host, filter_properties))
+
+    def test_aggregate_type_filter_ignores_other_host_state_metadata(self):
+        self._stub_aggregate_metadata_db()
+        filt_cls = self.class_map['AggregateTypeAffinityFilter']()
+        host = fakes.FakeHostState('host1', 'node1',
+                {'aggregates_metadata': {'availability_zone': set(['az1'])}})
+        filter_properties = {'context': self.context,
+                             'instance_type': {'name': 'fake1'}}
+        self.assertTrue(filt_cls.host_passes(host, filter_properties))
+
     def test_retry_filter_disabled(self):
         # Test case where retry/re-scheduling is disabled.
         filt_cls = self.class_map['RetryFilter']()
@@ -1454,3 +1642,119 @@ class HostFiltersTestCase(test.TestCase):
                                      'project_id': 'my_tenantid'}}}
         host = fakes.FakeHostState('host1', 'compute', {})
         self.assertTrue(filt_cls.host_passes(host, filter_properties))
+
+
+class FakeAttestationServer(object):
+    """Minimal OAT service answering PollHosts over HTTPS."""
+
+    def __init__(self, trust_levels):
+        self.trust_levels = trust_levels
+        self.requests = []
+        self.server = wsgi.Server("fake_oat", self, host='127.0.0.1',
+                                  port=0, use_ssl=True)
+
+    def __call__(self, environ, start_response):
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        body = jsonutils.loads(environ['wsgi.input'].read(length))
+        self.requests.append((environ['REMOTE_PORT'], body))
+        states = [{'host_name': host,
+                   'trust_lvl': self.trust_levels.get(host, 'unknown'),
+                   'vtime': timeutils.isotime()}
+                  for host in body['hosts']]
+        data = jsonutils.dumps({'hosts': states})
+        start_response('200 OK', [('Content-Type', 'application/json'),
+                                  ('Content-Length', str(len(data)))])
+        return [data]
+
+
+class TrustedFilterAttestationTestCase(test.TestCase):
+    """Test TrustedFilter against a local attestation server."""
+
+    def setUp(self):
+        super(TrustedFilterAttestationTestCase, self).setUp()
+        self.flags(ssl_cert_file=os.path.join(SSL_CERT_DIR, 'certificate.crt'),
+                   ssl_key_file=os.path.join(SSL_CERT_DIR, 'privatekey.key'))
+        self.oat = FakeAttestationServer({'host1': 'trusted',
+                                          'host2': 'untrusted'})
+        self.oat.server.start()
+        self.addCleanup(self.oat.server.wait)
+        self.addCleanup(self.oat.server.stop)
+        self.flags(attestation_server='127.0.0.1',
+                   attestation_port=str(self.oat.server.port),
+                   attestation_server_ca_file=os.path.join(SSL_CERT_DIR,
+                                                           'ca.crt'),
+                   group='trusted_computing')
+        trusted_filter.TrustedFilter._compute_attestation = None
+        self.context = context.get_admin_context()
+
+    def _attestation_service(self):
+        service = trusted_filter.AttestationService()
+        self.addCleanup(self._close_connections, service)
+        return service
+
+    def _close_connections(self, service):
+        # The server only stops once its keep-alive connections are closed.
+        for conn in service.connection_pool.free_items:
+            conn.close()
+
+    def _states(self, states):
+        return dict((state['host_name'], state['trust_lvl'])
+                    for state in states)
+
+    def test_attestation_reuses_connection(self):
+        service = self._attestation_service()
+        for i in xrange(3):
+            states = service.do_attestation(['host1', 'host2'])
+            self.assertEqual({'host1': 'trusted', 'host2': 'untrusted'},
+                             self._states(states))
+        self.assertEqual(3, len(self.oat.requests))
+        self.assertEqual(1, len(set(port for port, body
+                                    in self.oat.requests)))
+
+    def test_attestation_batches_hosts(self):
+        service = self._attestation_service()
+        service.request_count = 10
+        hosts = ['host%d' % i for i in xrange(35)]
+        states = service.do_attestation(hosts)
+        self.assertEqual(sorted(hosts), sorted(self._states(states)))
+        batches = [body for port, body in self.oat.requests]
+        self.assertEqual([10, 10, 10, 5],
+                         sorted((body['count'] for body in batches),
+                                reverse=True))
+        self.assertEqual(sorted(hosts),
+                         sorted(sum((body['hosts'] for body in batches),
+                                    [])))
+
+    def test_attestation_reconnects_dropped_connection(self):
+        service = self._attestation_service()
+        service.do_attestation(['host1'])
+        with service.connection_pool.item() as conn:
+            conn.sock.close()
+        states = service.do_attestation(['host1'])
+        self.assertEqual({'host1': 'trusted'}, self._states(states))
+        self.assertEqual(2, len(set(port for port, body
+                                    in self.oat.requests)))
+
+    def test_attestation_server_down(self):
+        # Stopping the server leaves its socket listening, so use a port
+        # nothing listens on instead.
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        self.flags(attestation_port=str(port), group='trusted_computing')
+        service = self._attestation_service()
+        self.assertEqual(None, service.do_attestation(['host1']))
+
+    def test_trusted_filter(self):
+        extra_specs = {'trust:trusted_host': 'trusted'}
+        filter_properties = {'context': self.context,
+                             'instance_type': {'memory_mb': 1024,
+                                               'extra_specs': extra_specs}}
+        filt_cls = trusted_filter.TrustedFilter()
+        self.addCleanup(self._close_connections,
+                        filt_cls.compute_attestation.caches.attestservice)
+        hosts = [fakes.FakeHostState('host1', 'node1', {}),
+                 fakes.FakeHostState('host2', 'node2', {})]
+        result = list(filt_cls.filter_all(hosts, filter_properties))
+        self.assertEqual(['host1'], [host.host for host in result])
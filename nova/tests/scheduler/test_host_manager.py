@@ -22,6 +22,7 @@ from nova import exception
 from nova.openstack.common import timeutils
 from nova.scheduler import filters
 from nova.scheduler import host_manager
+from nova.scheduler import stats as scheduler_stats
 from nova import test
 from nova.tests import matchers
 from nova.tests.scheduler import fakes
@@ -45,6 +46,8 @@ class HostManagerTestCase(test.TestCase):
         self.host_manager = host_manager.HostManager()
         self.fake_hosts = [host_manager.HostState('fake_host%s' % x,
                 'fake-node') for x in xrange(1, 5)]
+        self.stubs.Set(db, 'aggregate_get_all',
+                       lambda context: fakes.AGGREGATES)
         self.addCleanup(timeutils.clear_time_override)
 
     def test_choose_host_filters_not_found(self):
@@ -113,6 +116,78 @@ class HostManagerTestCase(test.TestCase):
                 fake_properties, filter_class_names=specified_filters)
         self._verify_result(info, result)
 
+    def test_get_filtered_hosts_collects_stats(self):
+        stats = scheduler_stats.SchedulerStats()
+        fake_properties = {'scheduler_stats': stats}
+        self.mox.StubOutWithMock(self.host_manager, '_choose_host_filters')
+        self.host_manager._choose_host_filters(None).AndReturn(
+                [FakeFilterClass1, FakeFilterClass2])
+        self.stubs.Set(FakeFilterClass1, 'host_passes',
+                       lambda _self, host, props: host.host != 'fake_host1')
+        self.stubs.Set(FakeFilterClass2, 'host_passes',
+                       lambda _self, host, props: True)
+
+        self.mox.ReplayAll()
+        result = self.host_manager.get_filtered_hosts(self.fake_hosts,
+                fake_properties)
+        self.assertEqual(self.fake_hosts[1:], result)
+        self.assertEqual(3, stats.filters['FakeFilterClass1']['passed'])
+        self.assertEqual(1, stats.filters['FakeFilterClass1']['rejected'])
+        self.assertEqual(3, stats.filters['FakeFilterClass2']['passed'])
+        self.assertEqual(0, stats.filters['FakeFilterClass2']['rejected'])
+
+    def test_get_filtered_hosts_adaptive_filter_order(self):
+        self.flags(scheduler_adaptive_filter_order=True)
+        self.host_manager.filter_classes = [FakeFilterClass1,
+                FakeFilterClass2]
+        self.flags(scheduler_default_filters=['FakeFilterClass1',
+                                              'FakeFilterClass2'])
+        calls = []
+
+        def fake_host_passes1(_self, host, props):
+            calls.append('FakeFilterClass1')
+            return True
+
+        def fake_host_passes2(_self, host, props):
+            calls.append('FakeFilterClass2')
+            return host.host != 'fake_host1'
+
+        self.stubs.Set(FakeFilterClass1, 'host_passes', fake_host_passes1)
+        self.stubs.Set(FakeFilterClass2, 'host_passes', fake_host_passes2)
+
+        result = self.host_manager.get_filtered_hosts(self.fake_hosts, {})
+        self.assertEqual(self.fake_hosts[1:], result)
+        self.assertEqual(['FakeFilterClass1'] * 4 + ['FakeFilterClass2'] * 4,
+                         calls)
+
+        # FakeFilterClass1 never rejects a host, so it now runs last.
+        calls = []
+        result = self.host_manager.get_filtered_hosts(self.fake_hosts, {})
+        self.assertEqual(self.fake_hosts[1:], result)
+        self.assertEqual(['FakeFilterClass2'] * 4 + ['FakeFilterClass1'] * 3,
+                         calls)
+
+    def test_order_filters(self):
+        class FakeFilterClass3(filters.BaseHostFilter):
+            pass
+
+        filter_handler = self.host_manager.filter_handler
+        # [hosts seen, hosts passed, seconds spent]
+        filter_handler.filter_costs = {
+            'FakeFilterClass1': [10.0, 10.0, 1.0],
+            'FakeFilterClass2': [10.0, 5.0, 1.0],
+            'FakeFilterClass3': [10.0, 0.0, 1.0]}
+        filter_classes = [FakeFilterClass1, FakeFilterClass2,
+                          FakeFilterClass3]
+
+        self.assertEqual([FakeFilterClass3, FakeFilterClass2,
+                          FakeFilterClass1],
+                         filter_handler.order_filters(filter_classes))
+        self.assertEqual([FakeFilterClass1, FakeFilterClass3,
+                          FakeFilterClass2],
+                         filter_handler.order_filters(filter_classes,
+                                                      ['FakeFilterClass1']))
+
     def test_get_filtered_hosts_with_ignore(self):
         fake_properties = {'ignore_hosts': ['fake_host1', 'fake_host3',
             'fake_host5']}
@@ -260,6 +335,16 @@ class HostManagerTestCase(test.TestCase):
                          3145728)
         self.assertEqual(host_states_map[('host4', 'node4')].free_ram_mb,
                          8192)
+        # Aggregate metadata is indexed by host
+        self.assertEqual(
+                host_states_map[('host1', 'node1')].aggregates_metadata,
+                {'availability_zone': set(['az1'])})
+        self.assertEqual(
+                host_states_map[('host2', 'node2')].aggregates_metadata,
+                {'availability_zone': set(['az1', 'az2']),
+                 'ssd': set(['true'])})
+        self.assertEqual(
+                host_states_map[('host3', 'node3')].aggregates_metadata, {})
         # 8191GB
         self.assertEqual(host_states_map[('host4', 'node4')].free_disk_mb,
                          8388608)
@@ -277,6 +362,8 @@ class HostManagerChangedNodesTestCase(test.TestCase):
               host_manager.HostState('host3', 'node3'),
               host_manager.HostState('host4', 'node4')
             ]
+        self.stubs.Set(db, 'aggregate_get_all',
+                       lambda context: fakes.AGGREGATES)
         self.addCleanup(timeutils.clear_time_override)
 
     def test_get_all_host_states(self):
@@ -322,6 +409,52 @@ class HostManagerChangedNodesTestCase(test.TestCase):
         host_states_map = self.host_manager.host_state_map
         self.assertEqual(len(host_states_map), 0)
 
+    def test_get_all_host_states_partial_refresh(self):
+        context = 'fake_context'
+        self.flags(scheduler_host_state_refresh_interval=60)
+        timeutils.set_time_override()
+        start = timeutils.utcnow()
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        # full load for the first call
+        db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        # only changed nodes until the refresh interval expires
+        changed_node = dict(fakes.COMPUTE_NODES[0], free_ram_mb=256,
+                            updated_at=start)
+        db.compute_node_get_all(context, updated_since=start).AndReturn(
+                [changed_node])
+        # full load again, node4 is gone
+        running_nodes = [n for n in fakes.COMPUTE_NODES
+                         if n.get('hypervisor_hostname') != 'node4']
+        db.compute_node_get_all(context).AndReturn(running_nodes)
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(context)
+        timeutils.advance_time_seconds(30)
+        self.host_manager.get_all_host_states(context)
+        host_states_map = self.host_manager.host_state_map
+        self.assertEqual(len(host_states_map), 4)
+        self.assertEqual(host_states_map[('host1', 'node1')].free_ram_mb,
+                         256)
+
+        timeutils.advance_time_seconds(31)
+        self.host_manager.get_all_host_states(context)
+        self.assertEqual(len(host_states_map), 3)
+
+    def test_update_service_capabilities_updates_host_state(self):
+        context = 'fake_context'
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(context)
+        self.host_manager.update_service_capabilities('compute', 'host1',
+                {'hypervisor_hostname': 'node1', 'foo': 'bar'})
+        host_state = self.host_manager.host_state_map[('host1', 'node1')]
+        self.assertEqual(host_state.capabilities['foo'], 'bar')
+        self.assertEqual(host_state.service['host'], 'host1')
+
 
 class HostStateTestCase(test.TestCase):
     """Test case for HostState class."""
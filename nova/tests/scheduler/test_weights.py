@@ -115,3 +115,16 @@ class RamWeigherTestCase(test.TestCase):
         weighed_host = self._get_weighed_host(hostinfo_list)
         self.assertEqual(weighed_host.weight, 8192 * 2)
         self.assertEqual(weighed_host.obj.host, 'host4')
+
+    def test_multiplier_looked_up_once(self):
+        calls = []
+
+        def fake_weight_multiplier(_self):
+            calls.append(1)
+            return 1.0
+
+        self.stubs.Set(self.weight_classes[0], '_weight_multiplier',
+                       fake_weight_multiplier)
+        hostinfo_list = self._get_all_hosts()
+        self._get_weighed_host(hostinfo_list)
+        self.assertEqual(len(calls), 1)
@@ -895,6 +895,46 @@ class DbApiTestCase(DbTestCase):
         self.assertEqual(record['vif_address'], vif['address'])
         data = db.network_get_associated_fixed_ips(ctxt, 1, 'nothing')
         self.assertEqual(len(data), 0)
+        data = db.network_get_associated_fixed_ips(ctxt, 1,
+                                                   address=fixed_address)
+        self.assertEqual([fixed_address], [d['address'] for d in data])
+        data = db.network_get_associated_fixed_ips(ctxt, 1, address='qux')
+        self.assertEqual(len(data), 0)
+
+    def test_fixed_ip_get_by_address_filter(self):
+        ctxt = context.get_admin_context()
+        vif1 = db.virtual_interface_create(ctxt, {'address': 'mac1',
+                                                  'instance_uuid': 'uuid1'})
+        vif2 = db.virtual_interface_create(ctxt, {'address': 'mac2',
+                                                  'instance_uuid': 'uuid2'})
+        fixed1 = db.fixed_ip_create(ctxt, {'address': '10.1.0.2',
+                                           'virtual_interface_id': vif1['id']})
+        db.fixed_ip_create(ctxt, {'address': '10.2.0.2',
+                                  'virtual_interface_id': vif2['id']})
+        db.fixed_ip_create(ctxt, {'address': '10.1.0.3'})
+        fixed1_id = db.fixed_ip_get_by_address(ctxt, fixed1)['id']
+        db.floating_ip_create(ctxt, {'address': '172.16.0.1',
+                                     'fixed_ip_id': fixed1_id})
+        db.floating_ip_create(ctxt, {'address': '172.16.0.2',
+                                     'fixed_ip_id': fixed1_id})
+
+        def _addresses(**kwargs):
+            return [(ip['instance_uuid'], ip['address'], ip['floating_ips'])
+                    for ip in db.fixed_ip_get_by_address_filter(ctxt,
+                                                                **kwargs)]
+
+        self.assertEqual(_addresses(),
+                         [('uuid1', '10.1.0.2', ['172.16.0.1', '172.16.0.2']),
+                          ('uuid2', '10.2.0.2', [])])
+        self.assertEqual(_addresses(address='10.2.0.2'),
+                         [('uuid2', '10.2.0.2', [])])
+        self.assertEqual(_addresses(address_like='10_1_%'),
+                         [('uuid1', '10.1.0.2', ['172.16.0.1', '172.16.0.2'])])
+        self.assertEqual(_addresses(address='10.2.0.2',
+                                    address_like='172.16.0.2%'),
+                         [('uuid1', '10.1.0.2', ['172.16.0.2']),
+                          ('uuid2', '10.2.0.2', [])])
+        self.assertEqual(_addresses(address_like='192.%'), [])
 
     def test_network_get_all_by_host(self):
         ctxt = context.get_admin_context()
@@ -1066,6 +1106,45 @@ class DbApiTestCase(DbTestCase):
         _compare(bw_usages[2], expected_bw_usages[2])
         timeutils.clear_time_override()
 
+    def test_bw_usage_bulk_calls(self):
+        ctxt = context.get_admin_context()
+        now = timeutils.utcnow()
+        timeutils.set_time_override(now)
+        start_period = now - datetime.timedelta(seconds=10)
+        prev_period = start_period - datetime.timedelta(seconds=3600)
+
+        db.bw_usage_update(ctxt, 'fake_uuid1', 'fake_mac1', prev_period,
+                           10, 20, 1000, 2000)
+        db.bw_usage_update(ctxt, 'fake_uuid1', 'fake_mac1', start_period,
+                           100, 200, 12345, 67890)
+        db.bw_usage_update(ctxt, 'fake_uuid3', 'fake_mac3', start_period,
+                           1, 2, 3, 4)
+
+        bw_usages = db.bw_usage_get_by_uuids_and_periods(ctxt,
+                ['fake_uuid1', 'fake_uuid2'], [start_period, prev_period])
+        self.assertEqual(sorted(bw['start_period'] for bw in bw_usages),
+                         [prev_period, start_period])
+
+        db.bw_usage_update_all(ctxt, start_period,
+                [{'uuid': 'fake_uuid1', 'mac': 'fake_mac1',
+                  'bw_in': 150, 'bw_out': 250,
+                  'last_ctr_in': 12395, 'last_ctr_out': 67940},
+                 {'uuid': 'fake_uuid2', 'mac': 'fake_mac2',
+                  'bw_in': 0, 'bw_out': 0,
+                  'last_ctr_in': 42, 'last_ctr_out': 43}])
+
+        bw_usages = db.bw_usage_get_by_uuids(ctxt,
+                ['fake_uuid1', 'fake_uuid2', 'fake_uuid3'], start_period)
+        bw_usages = dict((bw['uuid'], bw) for bw in bw_usages)
+        self.assertEqual(len(bw_usages), 3)
+        self.assertEqual(bw_usages['fake_uuid1']['bw_in'], 150)
+        self.assertEqual(bw_usages['fake_uuid1']['last_ctr_out'], 67940)
+        self.assertEqual(bw_usages['fake_uuid2']['mac'], 'fake_mac2')
+        self.assertEqual(bw_usages['fake_uuid2']['last_ctr_in'], 42)
+        self.assertEqual(bw_usages['fake_uuid2']['last_refreshed'], now)
+        self.assertEqual(bw_usages['fake_uuid3']['bw_in'], 1)
+        timeutils.clear_time_override()
+
     def test_key_pair_create(self):
         ctxt = context.get_admin_context()
         values = {'name': 'test_keypair', 'public_key': 'test-public-key',
@@ -1598,6 +1677,34 @@ class CapacityTestCase(test.TestCase):
         self.assertEqual(2, int(stats['num_proj_12345']))
         self.assertEqual(3, int(stats['num_vm_building']))
 
+    def test_compute_node_get_all_updated_since(self):
+        item = self._create_helper('host1')
+        created = timeutils.utcnow()
+        timeutils.set_time_override(created + datetime.timedelta(seconds=10))
+        self.addCleanup(timeutils.clear_time_override)
+        since = timeutils.utcnow()
+
+        nodes = db.compute_node_get_all(self.ctxt, updated_since=since)
+        self.assertEqual(0, len(nodes))
+
+        timeutils.advance_time_seconds(10)
+        db.compute_node_update(self.ctxt, item['id'], {'vcpus': 4})
+        nodes = db.compute_node_get_all(self.ctxt, updated_since=since)
+        self.assertEqual(1, len(nodes))
+        self.assertEqual(4, nodes[0]['vcpus'])
+
+    def test_compute_node_get_all_updated_since_service(self):
+        self._create_helper('host1')
+        timeutils.set_time_override(timeutils.utcnow() +
+                                    datetime.timedelta(seconds=10))
+        self.addCleanup(timeutils.clear_time_override)
+        since = timeutils.utcnow()
+
+        timeutils.advance_time_seconds(10)
+        db.service_update(self.ctxt, self.service['id'], {'report_count': 2})
+        nodes = db.compute_node_get_all(self.ctxt, updated_since=since)
+        self.assertEqual(1, len(nodes))
+
     def test_compute_node_update(self):
         item = self._create_helper('host1')
 
@@ -17,6 +17,9 @@
 #    under the License.
 """Unit Tests for network code."""
 
+import fixtures
+
+from nova import exception
 from nova.network import linux_net
 from nova import test
 
@@ -253,3 +256,106 @@ class IptablesManagerTestCase(test.TestCase):
                                                self.manager.ipv4['filter'],
                                                'filter')
         self.assertEqual(current_lines, new_lines)
+
+    def test_remove_rules_are_flushed(self):
+        table = self.manager.ipv4['filter']
+        for i in range(4):
+            table.add_rule('nova-filter-top', '-s 10.0.0.%d -j DROP' % i,
+                           wrap=False)
+        for i in range(4):
+            table.remove_rule('nova-filter-top', '-s 10.0.0.%d -j DROP' % i,
+                              wrap=False)
+        self.manager._modify_rules(self.sample_filter, table, 'filter')
+        self.assertEqual(table.remove_rules, [])
+
+
+class IptablesManagerApplyTestCase(test.TestCase):
+
+    def setUp(self):
+        super(IptablesManagerApplyTestCase, self).setUp()
+        self.flags(use_ipv6=False, lock_path=self.useFixture(
+            fixtures.TempDir()).path)
+        self.executes = []
+        self.manager = linux_net.IptablesManager(self._fake_execute)
+        self.table = self.manager.ipv4['filter']
+        self.binary_name = linux_net.binary_name
+
+    def _fake_execute(self, *cmd, **kwargs):
+        self.executes.append((cmd, kwargs.get('process_input')))
+        return '', ''
+
+    def _apply(self):
+        self.executes = []
+        self.manager.apply()
+        return self.executes
+
+    def test_apply_only_changed_chains(self):
+        self.table.add_chain('inst-1')
+        self.table.add_chain('inst-2')
+        self.table.add_rule('inst-1', '-j ACCEPT')
+        self.assertEqual([('iptables-save', '-c'), ('iptables-restore', '-c')],
+                         [cmd for cmd, _input in self._apply()])
+
+        self.assertEqual([], self._apply())
+
+        self.table.add_rule('inst-2', '-s 10.0.0.1 -j DROP')
+        self.table.add_rule('inst-2', '-j ACCEPT', top=True)
+        self.assertEqual(
+            [(('iptables-restore', '-c', '--noflush'),
+              '*filter\n'
+              ':%(bin)s-inst-2 - [0:0]\n'
+              '[0:0] -A %(bin)s-inst-2 -j ACCEPT\n'
+              '[0:0] -A %(bin)s-inst-2 -s 10.0.0.1 -j DROP\n'
+              'COMMIT\n' % {'bin': self.binary_name})],
+            self._apply())
+
+    def test_apply_removed_chains(self):
+        self.table.add_chain('inst-1')
+        self.table.add_rule('inst-1', '-j ACCEPT')
+        self.table.add_rule('local', '-j $inst-1')
+        self._apply()
+
+        self.table.remove_chain('inst-1')
+        self.assertEqual(
+            [(('iptables-restore', '-c', '--noflush'),
+              '*filter\n'
+              ':%(bin)s-local - [0:0]\n'
+              ':%(bin)s-inst-1 - [0:0]\n'
+              '-X %(bin)s-inst-1\n'
+              'COMMIT\n' % {'bin': self.binary_name})],
+            self._apply())
+
+    def test_apply_unwrapped_changes_in_full(self):
+        self._apply()
+        self.table.add_rule('nova-filter-top', '-j DROP', wrap=False)
+        self.assertEqual([('iptables-save', '-c'), ('iptables-restore', '-c')],
+                         [cmd for cmd, _input in self._apply()])
+
+        self.table.remove_rule('nova-filter-top', '-j DROP', wrap=False)
+        self.assertEqual([('iptables-save', '-c'), ('iptables-restore', '-c')],
+                         [cmd for cmd, _input in self._apply()])
+
+    def test_periodic_full_sync(self):
+        self._apply()
+        self.assertEqual([], self._apply())
+        self.manager.last_full_sync -= 600
+        self.assertEqual([('iptables-save', '-c'), ('iptables-restore', '-c')],
+                         [cmd for cmd, _input in self._apply()])
+
+        self.flags(iptables_full_sync_interval=0)
+        self.assertEqual([('iptables-save', '-c'), ('iptables-restore', '-c')],
+                         [cmd for cmd, _input in self._apply()])
+
+    def test_failed_apply_is_retried_in_full(self):
+        self._apply()
+        self.table.add_chain('inst-1')
+
+        def fail(*cmd, **kwargs):
+            raise exception.ProcessExecutionError()
+
+        self.manager.execute = fail
+        self.assertRaises(exception.ProcessExecutionError, self.manager.apply)
+
+        self.manager.execute = self._fake_execute
+        self.assertEqual([('iptables-save', '-c'), ('iptables-restore', '-c')],
+                         [cmd for cmd, _input in self._apply()])
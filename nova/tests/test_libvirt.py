@@ -3902,6 +3902,8 @@ class IptablesFirewallTestCase(test.TestCase):
                                    'instance_type_id': 1})
 
     def test_static_filters(self):
+        # This inspects the complete ruleset, so always rewrite all of it.
+        self.flags(iptables_full_sync_interval=0)
         instance_ref = self._create_instance_ref()
         src_instance_ref = self._create_instance_ref()
 
@@ -4090,8 +4092,8 @@ class IptablesFirewallTestCase(test.TestCase):
                                mox.IgnoreArg()).AndReturn((None, None))
         self.fw.add_filters_for_instance(instance_ref, mox.IgnoreArg(),
                                          mox.IgnoreArg())
-        self.fw.instance_rules(instance_ref,
-                               mox.IgnoreArg()).AndReturn((None, None))
+        self.fw.instance_rules(instance_ref, mox.IgnoreArg(),
+                               sg_cache={}).AndReturn((None, None))
         self.fw.add_filters_for_instance(instance_ref, mox.IgnoreArg(),
                                          mox.IgnoreArg())
         self.mox.ReplayAll()
@@ -4100,6 +4102,73 @@ class IptablesFirewallTestCase(test.TestCase):
         self.fw.instances[instance_ref['id']] = instance_ref
         self.fw.do_refresh_security_group_rules("fake")
 
+    def test_do_refresh_security_group_rules_compiles_groups_once(self):
+        admin_ctxt = context.get_admin_context()
+        secgroup = db.security_group_create(admin_ctxt,
+                                            {'user_id': 'fake',
+                                             'project_id': 'fake',
+                                             'name': 'testgroup',
+                                             'description': 'test group'})
+        src_secgroup = db.security_group_create(admin_ctxt,
+                                                {'user_id': 'fake',
+                                                 'project_id': 'fake',
+                                                 'name': 'testsourcegroup',
+                                                 'description': 'src group'})
+        db.security_group_rule_create(admin_ctxt,
+                                      {'parent_group_id': secgroup['id'],
+                                       'protocol': 'tcp',
+                                       'from_port': 22,
+                                       'to_port': 22,
+                                       'group_id': src_secgroup['id']})
+        src_instance_ref = self._create_instance_ref()
+        db.instance_add_security_group(admin_ctxt, src_instance_ref['uuid'],
+                                       src_secgroup['id'])
+        instance_refs = []
+        for i in range(3):
+            instance_ref = self._create_instance_ref()
+            db.instance_add_security_group(admin_ctxt, instance_ref['uuid'],
+                                           secgroup['id'])
+            instance_refs.append(db.instance_get(admin_ctxt,
+                                                 instance_ref['id']))
+
+        network_model = _fake_network_info(self.stubs, 1, spectacular=True)
+        nw_info_calls = []
+
+        def fake_get_nw_info(*args, **kwargs):
+            nw_info_calls.append(args)
+            return network_model
+
+        _fake_stub_out_get_nw_info(self.stubs, fake_get_nw_info)
+
+        rule_lookups = []
+        virtapi = self.fw._virtapi
+        real_rule_get = virtapi.security_group_rule_get_by_security_group
+
+        def fake_rule_get(ctxt, security_group):
+            rule_lookups.append(security_group['id'])
+            return real_rule_get(ctxt, security_group)
+
+        self.stubs.Set(virtapi, 'security_group_rule_get_by_security_group',
+                       fake_rule_get)
+
+        network_info = network_model.legacy()
+        for instance_ref in instance_refs:
+            self.fw.instances[instance_ref['id']] = instance_ref
+            self.fw.network_infos[instance_ref['id']] = network_info
+        self.fw.do_refresh_security_group_rules(secgroup['id'])
+
+        self.assertEqual([secgroup['id']], rule_lookups)
+        self.assertEqual(1, len(nw_info_calls))
+        member_ip = [ip['address'] for ip in network_model.fixed_ips()
+                     if ip['version'] == 4][0]
+        for instance_ref in instance_refs:
+            chain = self.fw._instance_chain_name(instance_ref)
+            rules = [rule.rule
+                     for rule in self.fw.iptables.ipv4['filter'].rules
+                     if rule.chain == chain]
+            self.assertTrue('-j ACCEPT -p tcp --dport 22 -s %s' % member_ip
+                            in rules)
+
     def test_unfilter_instance_undefines_nwfilter(self):
         admin_ctxt = context.get_admin_context()
 
@@ -0,0 +1,89 @@
+# Copyright 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the in process memcache client."""
+
+from nova.openstack.common import memorycache
+from nova.openstack.common import timeutils
+from nova import test
+
+
+class MemorycacheTestCase(test.TestCase):
+    def setUp(self):
+        super(MemorycacheTestCase, self).setUp()
+        self.useFixture(test.TimeOverride())
+        self.client = memorycache.get_client()
+
+    def _stats(self):
+        return self.client.get_stats()[0][1]
+
+    def test_set_get(self):
+        self.assertEqual(None, self.client.get('foo'))
+        self.client.set('foo', 'bar')
+        self.assertEqual('bar', self.client.get('foo'))
+        self.assertEqual(1, self._stats()['get_hits'])
+        self.assertEqual(1, self._stats()['get_misses'])
+
+    def test_expiry(self):
+        self.client.set('foo', 'bar', time=10)
+        self.client.set('baz', 'qux')
+        timeutils.advance_time_seconds(9)
+        self.assertEqual('bar', self.client.get('foo'))
+        timeutils.advance_time_seconds(1)
+        self.assertEqual(None, self.client.get('foo'))
+        self.assertEqual('qux', self.client.get('baz'))
+        self.assertEqual(1, self._stats()['curr_items'])
+
+    def test_expiry_of_other_keys(self):
+        self.client.set('foo', 'bar', time=10)
+        timeutils.advance_time_seconds(10)
+        self.client.get('baz')
+        self.assertEqual(0, self._stats()['curr_items'])
+
+    def test_set_again_extends_expiry(self):
+        self.client.set('foo', 'bar', time=10)
+        timeutils.advance_time_seconds(5)
+        self.client.set('foo', 'bar', time=10)
+        timeutils.advance_time_seconds(5)
+        self.assertEqual('bar', self.client.get('foo'))
+        timeutils.advance_time_seconds(5)
+        self.assertEqual(None, self.client.get('foo'))
+
+    def test_add_incr_delete(self):
+        self.assertTrue(self.client.add('foo', '1'))
+        self.assertFalse(self.client.add('foo', '2'))
+        self.assertEqual(3, self.client.incr('foo', 2))
+        self.assertEqual('3', self.client.get('foo'))
+        self.client.delete('foo')
+        self.assertEqual(None, self.client.get('foo'))
+        self.assertEqual(None, self.client.incr('foo'))
+
+    def test_max_size_evicts_least_recently_used(self):
+        self.flags(memorycache_max_size=2)
+        client = memorycache.get_client()
+        client.set('a', 1)
+        client.set('b', 2)
+        client.get('a')
+        client.set('c', 3)
+        self.assertEqual(None, client.get('b'))
+        self.assertEqual(1, client.get('a'))
+        self.assertEqual(3, client.get('c'))
+        self.assertEqual(1, client.get_stats()[0][1]['evictions'])
+
+    def test_stale_timeouts_are_dropped(self):
+        for i in xrange(1000):
+            self.client.set('foo', i, time=60)
+        self.assertTrue(len(self.client.timeouts) <= 102)
+        self.assertEqual(999, self.client.get('foo'))
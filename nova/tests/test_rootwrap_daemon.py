@@ -0,0 +1,92 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the long-lived root wrapper, run without sudo."""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import eventlet
+
+import nova
+from nova.openstack.common.rootwrap import client
+from nova import test
+
+DAEMON = os.path.join(os.path.dirname(os.path.dirname(nova.__file__)),
+                      'bin', 'nova-rootwrap-daemon')
+
+
+class RootwrapDaemonTestCase(test.TestCase):
+    def setUp(self):
+        super(RootwrapDaemonTestCase, self).setUp()
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        filters_path = os.path.join(self.tempdir, 'rootwrap.d')
+        os.mkdir(filters_path)
+        with open(os.path.join(filters_path, 'test.filters'), 'w') as f:
+            f.write('[Filters]\n'
+                    'cat: CommandFilter, /bin/cat, root\n'
+                    'sh: CommandFilter, /bin/sh, root\n')
+        config = os.path.join(self.tempdir, 'rootwrap.conf')
+        with open(config, 'w') as f:
+            f.write('[DEFAULT]\nfilters_path=%s\n' % filters_path)
+
+        self.client = client.Client([sys.executable, DAEMON, config])
+        self.addCleanup(self.client.stop)
+
+    def test_execute(self):
+        self.assertEqual((0, 'foo', ''),
+                         self.client.execute(['cat'], 'foo'))
+        self.assertEqual((3, 'out\n', 'err\n'),
+                         self.client.execute(['sh', '-c',
+                                              'echo out; echo err >&2; '
+                                              'exit 3']))
+
+    def test_large_output(self):
+        data = os.urandom(1024 * 1024)
+        self.assertEqual((0, data, ''), self.client.execute(['cat'], data))
+
+    def test_unauthorized(self):
+        returncode, stdout, stderr = self.client.execute(['rm', '-rf', '/'])
+        self.assertEqual(99, returncode)
+        self.assertIn('Unauthorized command', stdout)
+
+    def test_concurrent_commands(self):
+        pool = eventlet.GreenPool()
+        results = list(pool.imap(
+            lambda i: self.client.execute(['sh', '-c', 'sleep 0.1; echo %d'
+                                           % i]),
+            range(5)))
+        self.assertEqual([(0, '%d\n' % i, '') for i in range(5)], results)
+
+    def test_restarts_dead_daemon(self):
+        self.client.execute(['cat'])
+        path = self.client._path
+        self.client._process.kill()
+        self.client._process.wait()
+        self.assertEqual((0, 'foo', ''), self.client.execute(['cat'], 'foo'))
+        self.assertNotEqual(path, self.client._path)
+
+    def test_daemon_exits_with_client(self):
+        self.client.execute(['cat'])
+        path = self.client._path
+        process = self.client._process
+        self.client.stop()
+        self.assertEqual(0, process.returncode)
+        self.assertFalse(os.path.exists(os.path.dirname(path)))
@@ -154,6 +154,25 @@ grep foo
             os.unlink(tmpfilename)
             os.unlink(tmpfilename2)
 
+    def test_run_as_root_uses_rootwrap_daemon(self):
+        calls = []
+
+        class FakeClient(object):
+            def execute(self, cmd, process_input=None):
+                calls.append((cmd, process_input))
+                return len(calls) - 1, 'out', 'err'
+
+        self.flags(use_rootwrap_daemon=True)
+        self.stubs.Set(os, 'geteuid', lambda: 1000)
+        self.stubs.Set(utils, '_get_rootwrap_client', lambda: FakeClient())
+
+        self.assertEqual(('out', 'err'),
+                         utils.execute('cat', process_input='foo',
+                                       run_as_root=True))
+        self.assertRaises(exception.ProcessExecutionError,
+                          utils.execute, 'false', 1, run_as_root=True)
+        self.assertEqual([(['cat'], 'foo'), (['false', '1'], None)], calls)
+
 
 class GetFromPathTestCase(test.TestCase):
     def test_tolerates_nones(self):
@@ -2043,6 +2043,8 @@ class XenAPIDom0IptablesFirewallTestCase(stubs.XenAPITestBase):
                    instance_name_template='%d',
                    firewall_driver='nova.virt.xenapi.firewall.'
                                    'Dom0IptablesFirewallDriver')
+        # These tests inspect the complete ruleset after every apply
+        self.flags(iptables_full_sync_interval=0)
         xenapi_fake.create_local_srs()
         xenapi_fake.create_local_pifs()
         self.user_id = 'mappin'
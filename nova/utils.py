@@ -49,6 +49,7 @@ from nova import exception
 from nova.openstack.common import excutils
 from nova.openstack.common import importutils
 from nova.openstack.common import log as logging
+from nova.openstack.common.rootwrap import client as rootwrap_client
 from nova.openstack.common.rpc import common as rpc_common
 from nova.openstack.common import timeutils
 
@@ -80,6 +81,11 @@ utils_opts = [
                default="/etc/nova/rootwrap.conf",
                help='Path to the rootwrap configuration file to use for '
                     'running commands as root'),
+    cfg.BoolOpt('use_rootwrap_daemon',
+                default=False,
+                help='Run commands as root through a long-lived '
+                     'nova-rootwrap-daemon instead of starting '
+                     'nova-rootwrap for every command'),
     cfg.StrOpt('tempdir',
                default=None,
                help='Explicitly specify the temporary working directory'),
@@ -90,6 +96,8 @@ CONF.register_opts(utils_opts)
 
 LOG = logging.getLogger(__name__)
 
+_ROOTWRAP_CLIENT = None
+
 # Used for looking up extensions of text
 # to their 'multiplied' byte amount
 BYTE_MULTIPLIERS = {
@@ -156,6 +164,14 @@ def _subprocess_setup():
     signal.signal(signal.SIGPIPE, signal.SIG_DFL)
 
 
+def _get_rootwrap_client():
+    global _ROOTWRAP_CLIENT
+    if _ROOTWRAP_CLIENT is None:
+        _ROOTWRAP_CLIENT = rootwrap_client.Client(
+            ['sudo', 'nova-rootwrap-daemon', CONF.rootwrap_config])
+    return _ROOTWRAP_CLIENT
+
+
 def execute(*cmd, **kwargs):
     """Helper method to execute command with optional retry.
 
@@ -173,7 +189,9 @@ def execute(*cmd, **kwargs):
                                before retrying.
     :param attempts:           How many times to retry cmd.
     :param run_as_root:        True | False. Defaults to False. If set to True,
-                               the command is run with rootwrap.
+                               the command is run with rootwrap, or through
+                               the rootwrap daemon if use_rootwrap_daemon
+                               is set.
 
     :raises exception.NovaException: on receiving unknown arguments
     :raises exception.ProcessExecutionError:
@@ -198,38 +216,49 @@ def execute(*cmd, **kwargs):
         raise exception.NovaException(_('Got unknown keyword args '
                                         'to utils.execute: %r') % kwargs)
 
+    use_daemon = False
     if run_as_root and os.geteuid() != 0:
-        cmd = ['sudo', 'nova-rootwrap', CONF.rootwrap_config] + list(cmd)
+        if CONF.use_rootwrap_daemon and not shell:
+            use_daemon = True
+        else:
+            cmd = ['sudo', 'nova-rootwrap', CONF.rootwrap_config] + list(cmd)
 
     cmd = map(str, cmd)
 
     while attempts > 0:
         attempts -= 1
         try:
-            LOG.debug(_('Running cmd (subprocess): %s'), ' '.join(cmd))
-            _PIPE = subprocess.PIPE  # pylint: disable=E1101
-
-            if os.name == 'nt':
-                preexec_fn = None
-                close_fds = False
-            else:
-                preexec_fn = _subprocess_setup
-                close_fds = True
-
-            obj = subprocess.Popen(cmd,
-                                   stdin=_PIPE,
-                                   stdout=_PIPE,
-                                   stderr=_PIPE,
-                                   close_fds=close_fds,
-                                   preexec_fn=preexec_fn,
-                                   shell=shell)
-            result = None
-            if process_input is not None:
-                result = obj.communicate(process_input)
+            if use_daemon:
+                LOG.debug(_('Running cmd (rootwrap daemon): %s'),
+                          ' '.join(cmd))
+                _returncode, stdout, stderr = _get_rootwrap_client().execute(
+                        cmd, process_input)
+                result = (stdout, stderr)
             else:
-                result = obj.communicate()
-            obj.stdin.close()  # pylint: disable=E1101
-            _returncode = obj.returncode  # pylint: disable=E1101
+                LOG.debug(_('Running cmd (subprocess): %s'), ' '.join(cmd))
+                _PIPE = subprocess.PIPE  # pylint: disable=E1101
+
+                if os.name == 'nt':
+                    preexec_fn = None
+                    close_fds = False
+                else:
+                    preexec_fn = _subprocess_setup
+                    close_fds = True
+
+                obj = subprocess.Popen(cmd,
+                                       stdin=_PIPE,
+                                       stdout=_PIPE,
+                                       stderr=_PIPE,
+                                       close_fds=close_fds,
+                                       preexec_fn=preexec_fn,
+                                       shell=shell)
+                result = None
+                if process_input is not None:
+                    result = obj.communicate(process_input)
+                else:
+                    result = obj.communicate()
+                obj.stdin.close()  # pylint: disable=E1101
+                _returncode = obj.returncode  # pylint: disable=E1101
             LOG.debug(_('Result was %s') % _returncode)
             if not ignore_exit_code and _returncode not in check_exit_code:
                 (stdout, stderr) = result
@@ -340,9 +340,98 @@ class IptablesFirewallDriver(FirewallDriver):
                     '--dports', '%s:%s' % (rule['from_port'],
                                            rule['to_port'])]
 
-    def instance_rules(self, instance, network_info):
+    def _security_group_member_ips(self, ctxt, grantee_group, sg_cache):
+        """Returns the fixed ips of a group's members, by ip version."""
+        key = ('members', grantee_group['id'])
+        if key in sg_cache:
+            return sg_cache[key]
+
+        # FIXME(jkoelker) This needs to be ported up into
+        #                 the compute manager which already
+        #                 has access to a nw_api handle,
+        #                 and should be the only one making
+        #                 making rpc calls.
+        nw_api = network.API()
+        capi = conductor.API()
+        member_ips = {4: [], 6: []}
+        for member in grantee_group['instances']:
+            nw_info = nw_api.get_instance_nw_info(ctxt, member,
+                                                  conductor_api=capi)
+            for ip in nw_info.fixed_ips():
+                member_ips[ip['version']].append(ip['address'])
+
+        LOG.debug('ips: %r', member_ips)
+        sg_cache[key] = member_ips
+        return member_ips
+
+    def _security_group_rules(self, ctxt, security_group, sg_cache):
+        """Returns the ipv4 and ipv6 rules compiled from a security group."""
+        key = ('rules', security_group['id'])
+        if key in sg_cache:
+            return sg_cache[key]
+
+        ipv4_rules = []
+        ipv6_rules = []
+        rules = self._virtapi.security_group_rule_get_by_security_group(
+            ctxt, security_group)
+
+        for rule in rules:
+            LOG.debug(_('Adding security group rule: %r'), rule)
+
+            if not rule['cidr']:
+                version = 4
+            else:
+                version = netutils.get_ip_version(rule['cidr'])
+
+            if version == 4:
+                fw_rules = ipv4_rules
+            else:
+                fw_rules = ipv6_rules
+
+            protocol = rule['protocol']
+
+            if protocol:
+                protocol = rule['protocol'].lower()
+
+            if version == 6 and protocol == 'icmp':
+                protocol = 'icmpv6'
+
+            args = ['-j ACCEPT']
+            if protocol:
+                args += ['-p', protocol]
+
+            if protocol in ['udp', 'tcp']:
+                args += self._build_tcp_udp_rule(rule, version)
+            elif protocol == 'icmp':
+                args += self._build_icmp_rule(rule, version)
+            if rule['cidr']:
+                LOG.debug('Using cidr %r', rule['cidr'])
+                args += ['-s', rule['cidr']]
+                fw_rules += [' '.join(args)]
+            elif rule['grantee_group']:
+                member_ips = self._security_group_member_ips(
+                    ctxt, rule['grantee_group'], sg_cache)
+                for ip in member_ips[version]:
+                    subrule = args + ['-s %s' % ip]
+                    fw_rules += [' '.join(subrule)]
+
+            LOG.debug('Using fw_rules: %r', fw_rules)
+
+        sg_cache[key] = (ipv4_rules, ipv6_rules)
+        return ipv4_rules, ipv6_rules
+
+    def instance_rules(self, instance, network_info, sg_cache=None):
+        """Returns the ipv4 and ipv6 rules of the chain of an instance.
+
+        The rules of each security group, including the addresses of the
+        members of the groups they grant access to, are compiled once per
+        sg_cache. Pass the same dict for all instances refreshed together
+        to share that work between them.
+        """
         # make sure this is legacy nw_info
         network_info = self._handle_network_info_model(network_info)
+        if sg_cache is None:
+            sg_cache = {}
 
         ctxt = context.get_admin_context()
 
@@ -370,68 +459,10 @@ class IptablesFirewallDriver(FirewallDriver):
 
         # then, security group chains and rules
         for security_group in security_groups:
-            rules = self._virtapi.security_group_rule_get_by_security_group(
-                ctxt, security_group)
-
-            for rule in rules:
-                LOG.debug(_('Adding security group rule: %r'), rule,
-                          instance=instance)
-
-                if not rule['cidr']:
-                    version = 4
-                else:
-                    version = netutils.get_ip_version(rule['cidr'])
-
-                if version == 4:
-                    fw_rules = ipv4_rules
-                else:
-                    fw_rules = ipv6_rules
-
-                protocol = rule['protocol']
-
-                if protocol:
-                    protocol = rule['protocol'].lower()
-
-                if version == 6 and protocol == 'icmp':
-                    protocol = 'icmpv6'
-
-                args = ['-j ACCEPT']
-                if protocol:
-                    args += ['-p', protocol]
-
-                if protocol in ['udp', 'tcp']:
-                    args += self._build_tcp_udp_rule(rule, version)
-                elif protocol == 'icmp':
-                    args += self._build_icmp_rule(rule, version)
-                if rule['cidr']:
-                    LOG.debug('Using cidr %r', rule['cidr'], instance=instance)
-                    args += ['-s', rule['cidr']]
-                    fw_rules += [' '.join(args)]
-                else:
-                    if rule['grantee_group']:
-                        # FIXME(jkoelker) This needs to be ported up into
-                        #                 the compute manager which already
-                        #                 has access to a nw_api handle,
-                        #                 and should be the only one making
-                        #                 making rpc calls.
-                        nw_api = network.API()
-                        capi = conductor.API()
-                        for instance in rule['grantee_group']['instances']:
-                            nw_info = nw_api.get_instance_nw_info(
-                                ctxt,
-                                instance,
-                                conductor_api=capi)
-
-                            ips = [ip['address']
-                                for ip in nw_info.fixed_ips()
-                                    if ip['version'] == version]
-
-                            LOG.debug('ips: %r', ips, instance=instance)
-                            for ip in ips:
-                                subrule = args + ['-s %s' % ip]
-                                fw_rules += [' '.join(subrule)]
-
-                LOG.debug('Using fw_rules: %r', fw_rules, instance=instance)
+            sg_ipv4_rules, sg_ipv6_rules = self._security_group_rules(
+                ctxt, security_group, sg_cache)
+            ipv4_rules += sg_ipv4_rules
+            ipv6_rules += sg_ipv6_rules
 
         ipv4_rules += ['-j $sg-fallback']
         ipv6_rules += ['-j $sg-fallback']
@@ -460,10 +491,15 @@ class IptablesFirewallDriver(FirewallDriver):
         self.add_filters_for_instance(instance, ipv4_rules, ipv6_rules)
 
     def do_refresh_security_group_rules(self, security_group):
+        # Instances sharing security groups reuse the rules compiled for
+        # the first of them, so a refresh costs one rule lookup per group
+        # and one network info lookup per grantee group member.
+        sg_cache = {}
         for instance in self.instances.values():
             network_info = self.network_infos[instance['id']]
             ipv4_rules, ipv6_rules = self.instance_rules(instance,
-                                                         network_info)
+                                                         network_info,
+                                                         sg_cache=sg_cache)
             self._inner_do_refresh_rules(instance, ipv4_rules, ipv6_rules)
 
     def do_refresh_instance_rules(self, instance):
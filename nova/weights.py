@@ -17,6 +17,8 @@
 Pluggable Weighing support
 """
 
+import operator
+
 from nova import loadables
 
 
@@ -48,8 +50,11 @@ class BaseWeigher(object):
         """Weigh multiple objects.  Override in a subclass if you need
         need access to all objects in order to manipulate weights.
         """
+        # The multiplier is usually a config option, which is slow to look
+        # up, so only do it once for all objects.
+        multiplier = self._weight_multiplier()
         for obj in weighed_obj_list:
-            obj.weight += (self._weight_multiplier() *
+            obj.weight += (multiplier *
                            self._weigh_object(obj.obj, weight_properties))
 
 
@@ -68,4 +73,5 @@ class BaseWeightHandler(loadables.BaseLoader):
             weigher = weigher_cls()
             weigher.weigh_objects(weighed_objs, weighing_properties)
 
-        return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)
+        return sorted(weighed_objs, key=operator.attrgetter('weight'),
+                      reverse=True)
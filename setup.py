@@ -68,6 +68,7 @@ setuptools.setup(
                'bin/nova-novncproxy',
                'bin/nova-objectstore',
                'bin/nova-rootwrap',
+               'bin/nova-rootwrap-daemon',
                'bin/nova-scheduler',
                'bin/nova-spicehtml5proxy',
                'bin/nova-xvpvncproxy',